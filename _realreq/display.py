@@ -2,50 +2,290 @@
 """Classes for outputing Dependency trees"""
 # Can't use Typing.protocol, because it is only introduced in 3.8, until then
 # We must just Support a simple protocol for display.
-# def display(dependency_tree: Mapping[str, List[str]])
+# def display(
+#     dependency_tree: Mapping[str, List[str]],
+#     index: Optional[Index],
+#     out: Optional[TextIO],
+# )
+import sys
 import typing
 import _realreq.requtils as requtils
+from _realreq.requtils.metadata import normalize_name
+
+FORMATS = ("freeze", "tree", "json", "jsonl", "dot")
+# Maps each package to the (file, line) of each import of it
+Sources = typing.Mapping[str, typing.Iterable[typing.Tuple[str, int]]]
+# Maps each package to its direct dependencies
+Dependencies = typing.Mapping[str, typing.Iterable[str]]
+
+
+class BufferedWriter:
+    """Collects text, and writes it to stream in large blocks
+
+    Displays write a record at a time, this keeps that from turning into a
+    write call per line.
+    """
+
+    def __init__(
+        self, stream: typing.Optional[typing.TextIO] = None, buffer_size: int = 1 << 16
+    ):
+        self.stream = stream if stream is not None else sys.stdout
+        self.buffer_size = buffer_size
+        self._pending: typing.List[str] = []
+        self._size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def write(self, text: str):
+        self._pending.append(text)
+        self._size += len(text)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self.stream.write("".join(self._pending))
+            self._pending = []
+            self._size = 0
+        self.stream.flush()
 
 
 class FreezeDisplay:
     """Freeze Display just writes out the dependencies in same format at pip freeze"""
 
     @classmethod
-    def display(_cls, dependency_tree: requtils.dependency_tree.DependencyGraph):
+    def display(
+        _cls,
+        dependency_tree: requtils.dependency_tree.DependencyGraph,
+        index: typing.Optional[requtils.Index] = None,
+        out: typing.Optional[typing.TextIO] = None,
+    ):
+        out = out if out is not None else sys.stdout
         pkgs = dependency_tree.nodes()
-        dep_ver = requtils.get_dependency_versions(pkgs)
+        dep_ver = requtils.get_dependency_versions(pkgs, index)
         sorted_list = sorted(list(dep_ver.items()), key=lambda x: x[0].lower())
-        print("\n".join(["{0}".format(v) for _, v in sorted_list]))
+        out.write("\n".join(["{0}".format(v) for _, v in sorted_list]) + "\n")
 
 
 class TreeDisplay:
-    """This displays Dependencies as a tree"""
+    """This displays Dependencies as a tree
 
-    _INDENT_LEVEL = 0
+    A package's dependencies are only shown the first time it appears, later
+    appearances are marked with (*). A package that depends on itself through
+    the branch it appears in is marked with (cycle).
+    """
 
     @classmethod
-    def display(_cls, dependency_tree: requtils.dependency_tree.DependencyGraph):
+    def display(
+        _cls,
+        dependency_tree: requtils.dependency_tree.DependencyGraph,
+        index: typing.Optional[requtils.Index] = None,
+        out: typing.Optional[typing.TextIO] = None,
+        max_depth: typing.Optional[int] = None,
+        imports: typing.Collection[str] = (),
+    ):
+        out = out if out is not None else sys.stdout
         pkgs = dependency_tree.nodes()
-        dep_ver = requtils.get_dependency_versions(pkgs)
+        dep_ver = requtils.get_dependency_versions(pkgs, index)
         sorted_list = sorted(list(dep_ver.items()), key=lambda x: x[0].lower())
+        roots = _cls.roots([pkg for pkg, _ in sorted_list], dependency_tree, imports)
+        # Write everything at once, rather than a line at a time
+        out.write("".join(_cls.render(roots, dependency_tree, max_depth)))
 
-        # TODO: this will double print trees
-        for (pkg, _) in sorted_list:
-            _cls._print_tree(pkg, dependency_tree)
+    @classmethod
+    def roots(
+        _cls,
+        pkgs: typing.List[str],
+        tree: requtils.dependency_tree.DependencyGraph,
+        imports: typing.Collection[str] = (),
+    ) -> typing.List[str]:
+        """The packages of pkgs that start a tree, in order
+
+        These are the packages nothing depends on. Packages that are only part
+        of a cycle have none of those above them, so the first package of each
+        such cycle starts a tree too, preferring the ones imported directly.
+        """
+        roots = [pkg for pkg in pkgs if not tree.get_dependants(pkg)]
+        reached = set(roots)
+        for root in roots:
+            reached |= tree.transitive_dependencies(root)
+        imported = {normalize_name(name) for name in imports}
+        # Stable, so each group stays in order
+        for pkg in sorted(pkgs, key=lambda p: normalize_name(p) not in imported):
+            if pkg not in reached:
+                roots.append(pkg)
+                reached.add(pkg)
+                reached |= tree.transitive_dependencies(pkg)
+        return roots
 
     @classmethod
-    def _print_tree(_cls, name, tree: requtils.dependency_tree.DependencyGraph):
-        if not _cls._INDENT_LEVEL and tree.get_dependants(name):
-            # This package is not a root to the graph
-            return
-        if not _cls._INDENT_LEVEL:
-            print(f"- {name}")
+    def render(
+        _cls,
+        roots: typing.Iterable[str],
+        tree: requtils.dependency_tree.DependencyGraph,
+        max_depth: typing.Optional[int] = None,
+    ) -> typing.List[str]:
+        """Render the trees below roots, returning the lines of output
+
+        Every package is expanded at most once, so this takes time linear in
+        the number of edges. Packages deeper than max_depth are not shown.
+        """
+        lines = []
+        expanded = set()
+        # Packages on the branch being rendered, to detect cycles
+        branch = set()
+        # (name, depth, leaving) items, leaving marks the end of a branch
+        stack = [(root, 0, False) for root in reversed(list(roots))]
+        while stack:
+            name, depth, leaving = stack.pop()
+            if leaving:
+                branch.discard(name)
+                continue
+            prefix = f"{'  '*depth}|- " if depth else "- "
+            children = tree.get_dependencies(name)
+            if name in branch:
+                lines.append(f"{prefix}{name} (cycle)\n")
+                continue
+            if name in expanded and children:
+                lines.append(f"{prefix}{name} (*)\n")
+                continue
+            lines.append(f"{prefix}{name}\n")
+            if not children or (max_depth is not None and depth >= max_depth):
+                continue
+            expanded.add(name)
+            branch.add(name)
+            stack.append((name, depth, True))
+            stack.extend(
+                (child, depth + 1, False) for child in sorted(children, reverse=True)
+            )
+        return lines
+
+
+def package_records(
+    dependency_tree: requtils.dependency_tree.DependencyGraph,
+    index: typing.Optional[requtils.Index] = None,
+    sources: typing.Optional[Sources] = None,
+    direct: typing.Optional[Dependencies] = None,
+) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+    """Yield a record describing each package in dependency_tree, sorted by name
+
+    Packages that aren't installed have no requirement or version. Sources are
+    the files that import the package directly, and imports the file and line of
+    each of those import statements.
+
+    When dependency_tree wasn't resolved, direct holds the dependencies of each
+    installed package instead. Dependants are unknown (None) then, and so are
+    the dependencies of packages that aren't installed.
+    """
+    if direct is not None:
+        direct = {normalize_name(name): deps for name, deps in direct.items()}
+    sources = {
+        normalize_name(name): files
+        for name, files in (sources if sources is not None else {}).items()
+    }
+    pkgs = sorted(dependency_tree.nodes(), key=str.lower)
+    # The index may answer with the canonical spelling of a name
+    versions = {
+        normalize_name(name): requirement
+        for name, requirement in requtils.get_dependency_versions(pkgs, index).items()
+    }
+    for pkg in pkgs:
+        requirement = versions.get(normalize_name(pkg))
+        imports = sorted(sources.get(normalize_name(pkg), ()))
+        version = None
+        if requirement is not None and "==" in requirement:
+            version = requirement.split("==", 1)[1]
+        if direct is None:
+            dependencies = sorted(dependency_tree.get_dependencies(pkg))
+            dependants = sorted(dependency_tree.get_dependants(pkg))
         else:
-            # Print pkg with indent, and tree marker
-            print(f"{'  '*_cls._INDENT_LEVEL}|- {name}")
-        children = tree.get_dependencies(name)
-        if children:
-            _cls._INDENT_LEVEL += 1
-            for child in children:
-                _cls._print_tree(child, tree)
-            _cls._INDENT_LEVEL -= 1
+            found = direct.get(normalize_name(pkg))
+            dependencies = sorted(found) if found is not None else None
+            dependants = None
+        yield {
+            "name": pkg,
+            "version": version,
+            "requirement": requirement,
+            "dependencies": dependencies,
+            "dependants": dependants,
+            "sources": sorted({path for path, _ in imports}),
+            "imports": [{"file": path, "line": line} for path, line in imports],
+        }
+
+
+class JsonDisplay:
+    """Writes a JSON document, with a record for every package
+
+    Records are written as they are produced, rather than building the whole
+    document first.
+    """
+
+    @classmethod
+    def display(
+        _cls,
+        dependency_tree: requtils.dependency_tree.DependencyGraph,
+        index: typing.Optional[requtils.Index] = None,
+        out: typing.Optional[typing.TextIO] = None,
+        sources: typing.Optional[Sources] = None,
+        direct: typing.Optional[Dependencies] = None,
+    ):
+        import json
+
+        out = out if out is not None else sys.stdout
+        out.write('{"packages": [')
+        sep = "\n"
+        for record in package_records(dependency_tree, index, sources, direct):
+            out.write(sep + json.dumps(record))
+            sep = ",\n"
+        out.write("\n]}\n")
+
+
+class JsonLinesDisplay:
+    """Writes a JSON record for every package, one per line"""
+
+    @classmethod
+    def display(
+        _cls,
+        dependency_tree: requtils.dependency_tree.DependencyGraph,
+        index: typing.Optional[requtils.Index] = None,
+        out: typing.Optional[typing.TextIO] = None,
+        sources: typing.Optional[Sources] = None,
+        direct: typing.Optional[Dependencies] = None,
+    ):
+        import json
+
+        out = out if out is not None else sys.stdout
+        for record in package_records(dependency_tree, index, sources, direct):
+            out.write(json.dumps(record) + "\n")
+
+
+class DotDisplay:
+    """Writes the dependency graph in the graphviz DOT language
+
+    Installed packages are labeled with their requirement specifier, edges
+    point from a package to its dependencies.
+    """
+
+    @classmethod
+    def display(
+        _cls,
+        dependency_tree: requtils.dependency_tree.DependencyGraph,
+        index: typing.Optional[requtils.Index] = None,
+        out: typing.Optional[typing.TextIO] = None,
+    ):
+        import json
+
+        out = out if out is not None else sys.stdout
+        out.write("digraph requirements {\n")
+        for record in package_records(dependency_tree, index):
+            # JSON strings are valid DOT strings
+            name = json.dumps(record["name"])
+            label = json.dumps(record["requirement"] or record["name"])
+            out.write(f"  {name} [label={label}];\n")
+            for dep in record["dependencies"]:
+                out.write(f"  {name} -> {json.dumps(dep)};\n")
+        out.write("}\n")
@@ -0,0 +1,109 @@
+"""Prebuilt index of module names, in place of data files that need parsing
+
+The standard library is stored as the top level modules of python 3.11 (from
+`sys.stdlib_module_names`), with the modules added and removed by each version.
+Alias keys are normalized with `normalize_alias`.
+"""
+import functools
+import sys
+import typing
+
+_STD_LIBS_3_11 = """
+__future__ _abc _aix_support _ast _asyncio _bisect _blake2 _bootsubprocess _bz2 _codecs
+_codecs_cn _codecs_hk _codecs_iso2022 _codecs_jp _codecs_kr _codecs_tw _collections
+_collections_abc _compat_pickle _compression _contextvars _crypt _csv _ctypes _curses
+_curses_panel _datetime _dbm _decimal _elementtree _frozen_importlib
+_frozen_importlib_external _functools _gdbm _hashlib _heapq _imp _io _json _locale
+_lsprof _lzma _markupbase _md5 _msi _multibytecodec _multiprocessing _opcode _operator
+_osx_support _overlapped _pickle _posixshmem _posixsubprocess _py_abc _pydecimal _pyio
+_queue _random _scproxy _sha1 _sha256 _sha3 _sha512 _signal _sitebuiltins _socket
+_sqlite3 _sre _ssl _stat _statistics _string _strptime _struct _symtable _thread
+_threading_local _tkinter _tokenize _tracemalloc _typing _uuid _warnings _weakref
+_weakrefset _winapi _zoneinfo abc aifc antigravity argparse array ast asynchat asyncio
+asyncore atexit audioop base64 bdb binascii bisect builtins bz2 cProfile calendar cgi
+cgitb chunk cmath cmd code codecs codeop collections colorsys compileall concurrent
+configparser contextlib contextvars copy copyreg crypt csv ctypes curses dataclasses
+datetime dbm decimal difflib dis distutils doctest email encodings ensurepip enum errno
+faulthandler fcntl filecmp fileinput fnmatch fractions ftplib functools gc genericpath
+getopt getpass gettext glob graphlib grp gzip hashlib heapq hmac html http idlelib
+imaplib imghdr imp importlib inspect io ipaddress itertools json keyword lib2to3
+linecache locale logging lzma mailbox mailcap marshal math mimetypes mmap modulefinder
+msilib msvcrt multiprocessing netrc nis nntplib nt ntpath nturl2path numbers opcode
+operator optparse os ossaudiodev pathlib pdb pickle pickletools pipes pkgutil platform
+plistlib poplib posix posixpath pprint profile pstats pty pwd py_compile pyclbr pydoc
+pydoc_data pyexpat queue quopri random re readline reprlib resource rlcompleter runpy
+sched secrets select selectors shelve shlex shutil signal site smtpd smtplib sndhdr
+socket socketserver spwd sqlite3 sre_compile sre_constants sre_parse ssl stat statistics
+string stringprep struct subprocess sunau symtable sys sysconfig syslog tabnanny tarfile
+telnetlib tempfile termios textwrap this threading time timeit tkinter token tokenize
+tomllib trace traceback tracemalloc tty turtle turtledemo types typing unicodedata
+unittest urllib uu uuid venv warnings wave weakref webbrowser winreg winsound wsgiref
+xdrlib xml xmlrpc zipapp zipfile zipimport zlib zoneinfo
+"""
+
+# (added, removed) modules for each version, compared to the version before it
+_CHANGES = {
+    (3, 7): ("contextvars _contextvars dataclasses", "fpectl"),
+    (3, 8): ("", "macpath"),
+    (3, 9): (
+        "graphlib zoneinfo _zoneinfo _peg_parser",
+        "dummy_threading _dummy_thread",
+    ),
+    (3, 10): ("", "formatter parser symbol _peg_parser"),
+    (3, 11): ("tomllib", "binhex"),
+    (3, 12): ("", "asynchat asyncore distutils imp smtpd"),
+    (3, 13): (
+        "",
+        "aifc audioop cgi cgitb chunk crypt _crypt imghdr lib2to3 mailcap msilib _msi "
+        "nis nntplib ossaudiodev pipes sndhdr spwd sunau telnetlib uu xdrlib",
+    ),
+}
+_OLDEST = (3, 6)
+_NEWEST = max(_CHANGES)
+# Modules removed from the standard library by any version, which are missing
+# from newer versions, but still imported by code that runs on older ones
+_REMOVED_STD_LIBS = frozenset(
+    name for _, removed in _CHANGES.values() for name in removed.split()
+)
+
+# Import names that differ from the name of the distribution providing them
+ALIASES = {
+    "pypfopt": "pyportfolioopt",
+}
+
+
+def normalize_alias(import_name: str) -> str:
+    """Normalize an import name, to look it up in a dict of aliases"""
+    return import_name.lower()
+
+
+@functools.lru_cache(maxsize=None)
+def std_libs(
+    version: typing.Optional[typing.Tuple[int, int]] = None,
+) -> typing.FrozenSet[str]:
+    """The top level modules in the standard library of the given python version
+
+    Defaults to the running version, and as the code scanned may target older
+    versions too, the modules removed by any version are included then. Versions
+    outside of the index use the closest version in it, and when running on
+    python 3.10+ the modules in `sys.stdlib_module_names` of the running version
+    are included too.
+    """
+    running = sys.version_info[:2]
+    if version is None:
+        return std_libs(running) | _REMOVED_STD_LIBS
+    version = tuple(version)
+    target = min(max(version, _OLDEST), _NEWEST)
+    names = set(_STD_LIBS_3_11.split())
+    names.add("__main__")
+    # Walk from 3.11 to the target version, one version at a time
+    for minor in range(11, target[1], 1 if target[1] > 11 else -1):
+        if target[1] > 11:
+            added, removed = _CHANGES[(3, minor + 1)]
+        else:
+            removed, added = _CHANGES[(3, minor)]
+        names.difference_update(removed.split())
+        names.update(added.split())
+    if version == running and hasattr(sys, "stdlib_module_names"):
+        names.update(sys.stdlib_module_names)
+    return frozenset(names)
@@ -9,23 +9,28 @@ The entirety of the implementation is considered private and shouldn't be relied
 on for as a stable interface.
 """
 import argparse
-import json
+import collections
+import contextlib
+import os
 import pathlib
+import sys
+import time
 import typing
 
 import _realreq.requtils as requtils
 import _realreq.display as display
+from _realreq.requtils import metadata
+from _realreq import module_index
+from _realreq.module_index import normalize_alias
+from _realreq.requtils import index_cache
+from _realreq.requtils.index_cache import CachedIndex
+from _realreq.requtils.lazy import LazySet
+from _realreq.requtils.scan_cache import CACHE_DIR_NAME, ScanCache, default_cache_dir
 
-
-HERE_PATH = pathlib.Path(__file__).resolve().parent.absolute()
-
-# Convert pathlib.Path to str for python 3.5 compatability
-with open(str(HERE_PATH / "std_lib.json")) as fi:
-    STD_LIBS = json.load(fi)["libs"]
-
-
-with open(str(HERE_PATH / "aliases.json")) as fi:
-    ALIASES = json.load(fi)
+# Built the first time it is used, so `--help` and other quick runs don't pay
+# for it
+STD_LIBS = LazySet(module_index.std_libs)
+ALIASES = module_index.ALIASES
 
 
 def main():
@@ -69,38 +74,544 @@ class RealReq:
             type=pathlib.Path,
             help="Path to text file containing aliases in <import name>=<install name> format",
         )
+        self.parser.add_argument(
+            "--no-auto-aliases",
+            action="store_true",
+            help="Don't look up the distribution that provides each import name in the installed environment, only use the builtin and given aliases.",
+        )
+        self.parser.add_argument(
+            "--python-version",
+            type=parse_python_version,
+            metavar="X.Y",
+            help="Python version your code targets, imports of its standard library are not requirements (Defaults to the running version).",
+        )
         self.parser.add_argument(
             "-i",
             "--invert",
             action="store_true",
             help="Display dependencies in inverted tree format",
         )
+        self.parser.add_argument(
+            "--format",
+            choices=display.FORMATS,
+            help="Output format. 'freeze' lists requirements like `pip freeze`, 'tree' shows each package with its dependencies below it, 'json' and 'jsonl' write a record for each package with its version, direct dependencies and the source files that import it, 'dot' writes the dependency graph for graphviz. The 'tree' and 'dot' formats resolve dependencies like --deep (Defaults to freeze, or tree with --invert).",
+        )
+        self.parser.add_argument(
+            "--max-depth",
+            type=int,
+            help="Limit how deep the tree is displayed, for the tree formats.",
+        )
+        self.parser.add_argument(
+            "--why",
+            action="append",
+            metavar="PKG",
+            help="Show the shortest chain of dependencies from a package imported by your source to PKG. Can be specified multiple times.",
+        )
+        self.parser.add_argument(
+            "--explain",
+            nargs="*",
+            metavar="PKG",
+            help="Show the file and line of every import of each PKG, or of every package when none are given.",
+        )
+        self.parser.add_argument(
+            "--cycles",
+            action="store_true",
+            help="Show the groups of packages that depend on each other.",
+        )
+        self.parser.add_argument(
+            "--backend",
+            default="auto",
+            choices=("auto",) + requtils.BACKENDS,
+            help="How to look up the metadata and versions of installed packages, 'pip' calls `pip show` and `pip freeze`, 'metadata' reads it directly from the environment realreq is installed in, 'auto' reads metadata when the `pip` on the PATH belongs to that environment, and calls pip otherwise (Defaults to auto).",
+        )
+        self.parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="Scan every source file and look up every package, without reading or updating the cache.",
+        )
+        self.parser.add_argument(
+            "--cache-dir",
+            type=pathlib.Path,
+            help=f"Directory for the scan and metadata cache (Defaults to {CACHE_DIR_NAME} in the source directory).",
+        )
+        self.parser.add_argument(
+            "--cache-hash",
+            action="store_true",
+            help="Reuse cached results for files whose timestamp changed, if the hash of their content is unchanged.",
+        )
+        self.parser.add_argument(
+            "-j",
+            "--jobs",
+            default=1,
+            type=parse_jobs,
+            help="Number of processes used to scan source files, and of concurrent `pip show` calls with the pip backend, 0 uses one per CPU (Defaults to 1).",
+        )
+        self.parser.add_argument(
+            "--parser",
+            default="regex",
+            choices=requtils.PARSERS,
+            help="How imports are found in source files, 'regex' matches import lines, 'mmap' matches the same lines in the raw bytes of each file which is faster for large files, 'ast' parses the files which is slower but finds every import statement (Defaults to regex).",
+        )
+        self.parser.add_argument(
+            "--since",
+            metavar="GIT_REF",
+            help="Only scan the files changed since the given git ref, reusing the scan cache for all other files. The cache should hold a full scan of the ref (e.g. restored from a previous CI run), if it was made at another commit, the files changed since that commit are scanned instead.",
+        )
+        self.parser.add_argument(
+            "-e",
+            "--exclude",
+            action="append",
+            metavar="PATTERN",
+            help="Skip the files and directories matching a .gitignore style pattern, relative to the source directory (e.g. 'tests/' or 'docs/**/*.py'). Can be specified multiple times.",
+        )
+        self.parser.add_argument(
+            "--no-ignore",
+            action="store_true",
+            help="Scan every directory, without reading .gitignore files or skipping virtual environments and the default excludes (.git, .hg, .svn, .tox, .nox, .venv, node_modules, build, __pycache__). --exclude still applies.",
+        )
+        self.parser.add_argument(
+            "-p",
+            "--project",
+            action="append",
+            type=pathlib.Path,
+            help="Directory of a project in the source tree, its requirements are written to a file in it (see --output-name). Can be specified multiple times, the source tree is only scanned once and every project is resolved together. Each file belongs to the deepest project it is in.",
+        )
+        self.parser.add_argument(
+            "--discover-projects",
+            action="store_true",
+            help="Treat every directory in the source tree with a setup.py or pyproject.toml as a project, like --project.",
+        )
+        self.parser.add_argument(
+            "--output-name",
+            default="requirements.txt",
+            help="Name of the file the requirements of each project are written to (Defaults to requirements.txt).",
+        )
+
+        self.parser.add_argument(
+            "-w",
+            "--watch",
+            action="store_true",
+            help="Keep running, and display the requirements again whenever they change. Only changed files are scanned again, and installed packages are only looked up again after the environment changes.",
+        )
+        self.parser.add_argument(
+            "--interval",
+            default=1.0,
+            type=float,
+            help="Seconds between checks for changes in watch mode (Defaults to 1).",
+        )
+
+        self.parser.add_argument(
+            "--stats",
+            action="store_true",
+            help="Report the time taken by each phase of the run, and counters of the work done (files scanned, bytes read, imports matched, lookups and calls to pip, graph size) to stderr.",
+        )
+        self.parser.add_argument(
+            "--stats-file",
+            type=pathlib.Path,
+            help="Write the report of --stats to this file as JSON.",
+        )
+        self.parser.add_argument(
+            "--profile",
+            type=pathlib.Path,
+            metavar="FILE",
+            help="Profile the run with cProfile, writing the results to FILE (read them with the pstats module).",
+        )
 
         self._args = self.parser.parse_args()
+        if self._args.backend == "auto":
+            self._args.backend = requtils.default_backend()
+        self._stats = (
+            requtils.Stats() if self._args.stats or self._args.stats_file else None
+        )
+        # The automatic aliases, and the fingerprint of the environment they
+        # were found in
+        self._auto_aliases: typing.Optional[typing.Tuple[str, typing.Dict]] = None
+        # The aliases of the last scan, to find the packages imports were renamed to
+        self._aliases: typing.Mapping[str, str] = ALIASES
+        # The search paths of the environment pip manages, once looked up
+        self._pip_paths: typing.Optional[typing.List[str]] = None
+        if self._args.since and self._args.no_cache:
+            self.parser.error(
+                "--since requires the scan cache, it can't be used with --no-cache"
+            )
+        if self._args.project or self._args.discover_projects:
+            self._check_projects()
+
+    def _check_projects(self):
+        if not self._args.source.is_dir():
+            self.parser.error("--project requires the source to be a directory")
+        if self._args.watch:
+            self.parser.error("--project can't be used with --watch")
+        if self._args.since and self._args.discover_projects:
+            # Only a full scan walks the tree to find projects
+            self.parser.error("--discover-projects can't be used with --since")
+        # Each project's file only holds its requirements, not diagnostics
+        for flag, given in [
+            ("--why", self._args.why),
+            ("--cycles", self._args.cycles),
+            ("--explain", self._args.explain is not None),
+        ]:
+            if given:
+                self.parser.error(f"--project can't be used with {flag}")
+        root = self._args.source.resolve()
+        for project in self._args.project or []:
+            project = project.resolve()
+            if not project.is_dir() or not (project == root or root in project.parents):
+                self.parser.error(f"--project {project} is not a directory in {root}")
 
     def __call__(self):
-        pkgs = search_source(self._args.source, aliases=self._read_aliases())
+        profiler = None
+        if self._args.profile:
+            import cProfile
 
-        if self._args.deep or self._args.invert:
-            tree = requtils.build_dep_tree(pkgs)
-            if self._args.invert:
-                display.TreeDisplay.display(tree.invert())
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            if self._args.watch:
+                self._watch()
             else:
-                display.FreezeDisplay.display(tree)
+                self._run()
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(str(self._args.profile))
+            self._report_stats()
 
-        # TODO: Shallow search doesn't generate a tree, but a list so for now
-        # We handle seperately, lets unify the handling
+    def _run(self):
+        with requtils.phase(self._stats, "fingerprint"):
+            fingerprint = self._fingerprint()
+        with requtils.phase(self._stats, "scan"):
+            cache = self._open_cache()
+            with cache if cache is not None else contextlib.nullcontext():
+                projects = [] if self._args.discover_projects else None
+                pkgs = self._search_source(cache, fingerprint, projects)
+        # Shared by every lookup during the run so the environment is only
+        # queried once
+        index = self._get_index(fingerprint)
+        if projects is not None or self._args.project:
+            projects = (projects or []) + [
+                str(p.resolve()) for p in self._args.project or []
+            ]
+            self._display_projects(pkgs, index, projects)
         else:
-            dep_ver = requtils.get_dependency_versions(pkgs)
-            sorted_list = sorted(list(dep_ver.items()), key=lambda x: x[0].lower())
-            print("\n".join(["{0}".format(v) for _, v in sorted_list]))
+            self._display(pkgs, index)
+        with requtils.phase(self._stats, "save"):
+            self._save_index(index)
+
+    def _report_stats(self):
+        if self._stats is None:
+            return
+        if self._args.stats:
+            sys.stderr.write(self._stats.report())
+        if self._args.stats_file:
+            self._args.stats_file.write_text(self._stats.to_json() + "\n")
+
+    def _search_source(
+        self,
+        cache: typing.Optional[ScanCache],
+        fingerprint: str,
+        projects: typing.Optional[typing.List[str]] = None,
+    ) -> requtils.ImportIndex:
+        self._aliases = self._read_aliases(fingerprint)
+        return find_imports(
+            self._args.source,
+            aliases=self._aliases,
+            cache=cache,
+            jobs=self._args.jobs,
+            parser=self._args.parser,
+            since=self._args.since,
+            stats=self._stats,
+            python_version=self._args.python_version,
+            projects=projects,
+            ignore=requtils.ignore_rules.Ignore(
+                self._args.source.resolve(),
+                self._args.exclude or (),
+                defaults=not self._args.no_ignore,
+                gitignore=not self._args.no_ignore,
+            ),
+        )
+
+    def _display_projects(
+        self,
+        imports: requtils.ImportIndex,
+        index: requtils.Index,
+        projects: typing.List[str],
+    ):
+        """Write the requirements of each project to a file in its directory
+
+        Every project is resolved in one dependency graph, so each package is
+        only looked up once.
+        """
+        if not projects:
+            sys.stderr.write(f"WARNING: No projects found in {self._args.source}\n")
+            return
+        by_project = imports.split(projects)
+        for project, project_imports in by_project.items():
+            # Like the source directory, a project's own package isn't a requirement
+            project_imports.discard(os.path.basename(project))
+        tree = None
+        if self._needs_tree():
+            tree = self._build_tree(set().union(*by_project.values()), index)
+        for project in sorted(by_project):
+            path = pathlib.Path(project) / self._args.output_name
+            with path.open("w") as fo:
+                self._display(by_project[project], index, fo, tree, project)
+
+    def _display(
+        self,
+        imports: requtils.ImportIndex,
+        index: requtils.Index,
+        stream: typing.Optional[typing.TextIO] = None,
+        tree: typing.Optional[requtils.dependency_tree.CompactDependencyGraph] = None,
+        root: typing.Optional[str] = None,
+    ):
+        """Display the requirements of imports to stream (Defaults to stdout)
+
+        When tree is given, the dependencies of the imports are taken from it
+        instead of being looked up. Sources are shown relative to root
+        (Defaults to the source directory).
+        """
+        pkgs = set(imports)
+        # Every format writes through one buffered writer
+        with display.BufferedWriter(stream) as out:
+            if self._args.explain is not None:
+                with requtils.phase(self._stats, "display"):
+                    self._display_explain(self._relative_sources(imports, root), out)
+                return
+            if self._args.why or self._args.cycles:
+                tree = self._resolve(pkgs, index, tree)
+                with requtils.phase(self._stats, "display"):
+                    if self._args.why:
+                        self._display_why(tree, pkgs, out)
+                    if self._args.cycles:
+                        for cycle in tree.cycles():
+                            out.write(
+                                "Dependency cycle: {0}\n".format(", ".join(cycle))
+                            )
+                return
+            fmt = self._format()
+            direct = None
+            if self._needs_tree():
+                tree = self._resolve(pkgs, index, tree)
+            else:
+                # Shallow search only shows the packages imported directly
+                tree = requtils.dependency_tree.DependencyGraph()
+                for pkg in pkgs:
+                    tree.add_node(pkg)
+                if fmt in ("json", "jsonl"):
+                    direct = self._direct_dependencies(pkgs, index)
+            if self._args.invert:
+                tree = tree.invert()
+
+            with requtils.phase(self._stats, "display"):
+                if fmt == "tree":
+                    display.TreeDisplay.display(
+                        tree, index, out, self._args.max_depth, pkgs
+                    )
+                elif fmt == "json":
+                    display.JsonDisplay.display(
+                        tree, index, out, self._relative_sources(imports, root), direct
+                    )
+                elif fmt == "jsonl":
+                    display.JsonLinesDisplay.display(
+                        tree, index, out, self._relative_sources(imports, root), direct
+                    )
+                elif fmt == "dot":
+                    display.DotDisplay.display(tree, index, out)
+                else:
+                    display.FreezeDisplay.display(tree, index, out)
+
+    def _format(self) -> str:
+        return self._args.format or ("tree" if self._args.invert else "freeze")
+
+    def _needs_tree(self) -> bool:
+        """Tests if the output shows more than the packages imported directly"""
+        if self._args.explain is not None:
+            return False
+        return bool(
+            self._args.why
+            or self._args.cycles
+            or self._args.deep
+            or self._args.invert
+            or self._format() in ("tree", "dot")
+        )
+
+    def _resolve(
+        self,
+        pkgs: typing.Set[str],
+        index: requtils.Index,
+        tree: typing.Optional[requtils.dependency_tree.CompactDependencyGraph],
+    ) -> requtils.dependency_tree.CompactDependencyGraph:
+        """The dependency graph of pkgs, taken from tree when it is given"""
+        if tree is None:
+            return self._build_tree(pkgs, index)
+        # A copy, as the graph may be inverted
+        return tree.subgraph(pkgs).compact()
+
+    def _direct_dependencies(
+        self, pkgs: typing.Set[str], index: requtils.Index
+    ) -> typing.Dict[str, typing.List[str]]:
+        """The direct dependencies of the installed packages of pkgs, by name
+
+        Looked up at once, without resolving the rest of the graph.
+        """
+        with requtils.phase(self._stats, "resolve"):
+            found = index.show(pkgs) if pkgs else []
+        return {p.name: list(p.deps) for p in found}
+
+    def _build_tree(
+        self, pkgs: typing.Set[str], index: requtils.Index
+    ) -> requtils.dependency_tree.CompactDependencyGraph:
+        with requtils.phase(self._stats, "resolve"):
+            # Only pip lookups wait on a subprocess, the metadata backend is
+            # bound by the interpreter, and gains nothing from threads
+            jobs = self._args.jobs if self._args.backend == "pip" else 1
+            tree = requtils.build_dep_tree(pkgs, index, self._stats, jobs).compact()
+        if self._stats is not None:
+            nodes = tree.nodes()
+            self._stats.count("graph_nodes", len(nodes))
+            self._stats.count(
+                "graph_edges", sum(len(tree.get_dependencies(n)) for n in nodes)
+            )
+        return tree
+
+    def _relative_sources(
+        self, imports: requtils.ImportIndex, root: typing.Optional[str] = None
+    ) -> requtils.ImportIndex:
+        """The imports of each package, relative to root or the source directory"""
+        if root is None:
+            source = self._args.source.resolve()
+            root = str(source.parent if source.is_file() else source)
+        return imports.relative_to(root)
+
+    def _display_explain(self, imports: requtils.ImportIndex, out: typing.TextIO):
+        # Accept package names in any spelling
+        names = {metadata.normalize_name(name): name for name in imports}
+        for target in self._args.explain or sorted(imports, key=str.lower):
+            name = names.get(metadata.normalize_name(target))
+            # Imports are renamed to the distribution providing them
+            alias = self._aliases.get(target) or self._aliases.get(
+                normalize_alias(target)
+            )
+            if name is None and alias:
+                name = names.get(metadata.normalize_name(alias))
+            if name is None:
+                out.write(f"{target} is not imported by your source\n")
+                continue
+            out.write(f"{name}\n")
+            for path, line in imports[name]:
+                out.write(f"  {path}:{line}\n")
+
+    def _display_why(self, tree, pkgs: typing.Set[str], out: typing.TextIO):
+        for target in self._args.why:
+            try:
+                chain = tree.why(target, pkgs)
+            except KeyError:
+                chain = None
+            if chain is None:
+                out.write(f"{target} is not required by your source\n")
+            else:
+                out.write(" -> ".join(chain) + "\n")
+
+    def _watch(self):
+        """Poll the source and environment, displaying requirements when they change
+
+        The imports of each file and the index of installed packages are kept
+        between polls, so only changed files are scanned again and the
+        environment is only queried again after packages change.
+        """
+        cache = self._open_cache()
+        if cache is None:
+            cache = ScanCache(None, parser=self._args.parser)
+        index = fingerprint = shown = None
+        try:
+            with cache:
+                while True:
+                    with requtils.phase(self._stats, "fingerprint"):
+                        current = self._fingerprint()
+                    with requtils.phase(self._stats, "scan"):
+                        found = self._search_source(cache, current)
+                    if current != fingerprint or self._shown(found) != shown:
+                        if current != fingerprint:
+                            index = self._get_index(current)
+                        fingerprint, shown = current, self._shown(found)
+                        self._display(found, index)
+                        with requtils.phase(self._stats, "save"):
+                            self._save_index(index)
+                    time.sleep(self._args.interval)
+        except KeyboardInterrupt:
+            pass
+
+    def _shown(
+        self, imports: requtils.ImportIndex
+    ) -> typing.Union[requtils.ImportIndex, typing.FrozenSet[str]]:
+        """What the display shows of imports, only a change to it is displayed
+
+        The places packages are imported are only shown when explaining, or
+        with JSON output, otherwise moving an import doesn't change anything.
+        """
+        if self._args.explain is not None or self._format() in ("json", "jsonl"):
+            return imports
+        return frozenset(imports)
+
+    def _environment_paths(self) -> typing.Optional[typing.List[str]]:
+        """The search paths of the environment the backend reads
+
+        The metadata backend reads the environment realreq runs in (None), but
+        pip may manage another one, so caches and aliases follow pip's instead.
+        """
+        if self._args.backend != "pip":
+            return None
+        if self._pip_paths is None:
+            site = requtils.pip_site_packages()
+            self._pip_paths = [site] if site is not None else list(sys.path)
+        return self._pip_paths
+
+    def _fingerprint(self) -> str:
+        return metadata.environment_fingerprint(self._environment_paths())
+
+    def _get_index(self, fingerprint: str) -> requtils.Index:
+        """Get the index of installed packages, remembering answers between runs"""
+        index = requtils.get_index(self._args.backend, self._stats)
+        if self._args.no_cache:
+            return index
+        path = self._cache_dir() / f"metadata-{self._args.backend}.json"
+        return CachedIndex(index, path, fingerprint, self._stats)
+
+    def _save_index(self, index: requtils.Index):
+        if not isinstance(index, CachedIndex):
+            return
+        try:
+            index.save()
+        except OSError as err:
+            sys.stderr.write(f"WARNING: Unable to save metadata cache ({err})\n")
+
+    def _cache_dir(self) -> pathlib.Path:
+        return self._args.cache_dir or default_cache_dir(self._args.source)
+
+    def _open_cache(self) -> typing.Optional[ScanCache]:
+        if self._args.no_cache:
+            return None
+        # Deferred until a cache is needed, like in ScanCache
+        import sqlite3
+
+        try:
+            return ScanCache(
+                self._cache_dir(),
+                hash_contents=self._args.cache_hash,
+                parser=self._args.parser,
+            )
+        except (OSError, sqlite3.Error) as err:
+            sys.stderr.write(f"WARNING: Unable to use scan cache ({err})\n")
+            return None
 
-    def _read_aliases(self) -> typing.Dict[str, str]:
+    def _read_aliases(self, fingerprint: str) -> typing.Dict[str, str]:
         # Split user_aliases
         cli_aliases = {}
         file_aliases = {}
 
-        if not (self._args.alias or self._args.alias_file):
+        auto_aliases = self._get_auto_aliases(fingerprint)
+        if not (self._args.alias or self._args.alias_file or auto_aliases):
             return ALIASES
         if self._args.alias:
             cli_aliases = split_aliases(self._args.alias)
@@ -108,53 +619,253 @@ class RealReq:
             with self._args.alias_file.open() as fi:
                 file_aliases = split_aliases(fi.readlines())
 
-        return {**ALIASES, **file_aliases, **cli_aliases}
+        # Layered rather than merged, so the builtin aliases aren't copied, and
+        # given aliases override the ones found in the environment
+        return collections.ChainMap(cli_aliases, file_aliases, ALIASES, auto_aliases)
+
+    def _get_auto_aliases(self, fingerprint: str) -> typing.Dict[str, str]:
+        """Aliases of the import names provided by installed distributions
+
+        Kept until the environment changes, and between runs in the cache.
+        """
+        if self._args.no_auto_aliases:
+            return {}
+        if self._auto_aliases is not None and self._auto_aliases[0] == fingerprint:
+            return self._auto_aliases[1]
+        with requtils.phase(self._stats, "aliases"):
+            paths = self._environment_paths()
+            if self._args.no_cache:
+                packages = metadata.packages_distributions(paths)
+            else:
+                packages = index_cache.cached_packages_distributions(
+                    self._cache_dir() / "modules.json", fingerprint, paths
+                )
+            aliases = {
+                normalize_alias(module): dist
+                for module, dist in metadata.import_aliases(packages).items()
+            }
+        self._auto_aliases = (fingerprint, aliases)
+        return aliases
 
 
 def split_aliases(aliases: typing.List[str]) -> typing.Dict[str, str]:
     res = [a.strip().split("=") for a in aliases]
     if any([len(_) != 2 for _ in res]):
         raise ValueError("Aliases must be in format of 'IMPORT_ALIAS'='PKG_NAME'")
-    return dict(res)
+    return {normalize_alias(import_name): pkg for import_name, pkg in res}
+
+
+def parse_python_version(version: str) -> typing.Tuple[int, int]:
+    """Parse a python version in X.Y format"""
+    try:
+        major, minor = (int(part) for part in version.split("."))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid python version: '{version}', expected X.Y"
+        )
+    return major, minor
+
+
+def _record_commit(cache: ScanCache, root: str):
+    """Record the commit root is at in cache, for later scans with since"""
+    try:
+        commit = requtils.git_commit(root)
+        changed = requtils.git_changed_files(root, "HEAD")
+    except requtils.GitError:
+        commit, changed = None, set()
+    cache.set_scanned_at(root, commit, changed)
+
+
+def parse_jobs(jobs: str) -> int:
+    """Parse a job count, 0 or more"""
+    try:
+        count = int(jobs)
+    except ValueError:
+        count = -1
+    if count < 0:
+        raise argparse.ArgumentTypeError(
+            f"invalid job count: '{jobs}', expected 0 or more"
+        )
+    return count
+
+
+def search_source(
+    source,
+    aliases=ALIASES,
+    cache: typing.Optional[ScanCache] = None,
+    jobs: int = 1,
+    parser: str = "regex",
+    since: typing.Optional[str] = None,
+) -> typing.Set[str]:
+    """Go through the source directory and identify all modules
+
+    See `find_imports` for a description of the arguments.
+    """
+    return set(find_imports(source, aliases, cache, jobs, parser, since))
+
+
+def find_imports(
+    source,
+    aliases=ALIASES,
+    cache: typing.Optional[ScanCache] = None,
+    jobs: int = 1,
+    parser: str = "regex",
+    since: typing.Optional[str] = None,
+    stats: typing.Optional[requtils.Stats] = None,
+    python_version: typing.Optional[typing.Tuple[int, int]] = None,
+    projects: typing.Optional[typing.List[str]] = None,
+    ignore: typing.Optional[requtils.ignore_rules.Ignore] = None,
+) -> requtils.ImportIndex:
+    """Go through the source directory, finding the file and line of every import
 
+    Returns an index mapping each module to the (file, line) of the statements
+    that import it.
 
-def search_source(source, aliases=ALIASES):
-    """Go through the source directory and identify all modules"""
+    Files are streamed from the directory walk to the scanner, so neither the
+    list of files nor their content is held in memory. When a cache is given,
+    files that are unchanged since they were cached aren't scanned again. Files
+    are scanned by a pool of worker processes when jobs is more than 1. The
+    parser is passed on to `requtils.scan_file`.
+
+    With since (a git ref) and a cache that holds a previous scan of source,
+    only the files changed since that scan are scanned, the imports of every
+    other file are taken from the cache. A full scan records the commit it was
+    made at, and the files that differed from it, the changes are found by
+    comparing against that commit, which should be since.
+
+    With stats, the files found, and the files scanned or taken from the cache
+    are counted.
+
+    Standard library modules of python_version (defaulting to the running
+    version) are left out. Imports are renamed by aliases, which are looked up
+    by the import name, or by the name normalized with `normalize_alias`.
+
+    When projects is given, the project directories found while walking source
+    are appended to it (see `requtils.iter_source_files`), only a full scan of
+    a directory walks the tree.
+
+    With ignore (whose root must be the resolved source directory), ignored
+    files aren't scanned, and ignored directories aren't walked.
+    """
     source = pathlib.Path(source)
-    is_module = source.is_file() and source.suffix.lower() == ".py"
+    root = str(source.resolve())
+    is_module = source.is_file() and requtils.is_source_file(source.name)
+
+    imports = requtils.ImportIndex()
+    seen = set()
+    # Stats of the files that weren't found in the cache, and need scanning
+    pending = {}
+
+    def add_imports(path, found):
+        # 1. Eliminate the imports which start with `.` These are relative
+        #   imports, and so don't matter for pip requirements
+        # 2. Split imports on `.` we only want the top level module name
+        for m, line in found:
+            if not m.startswith("."):
+                imports.add(m.split(".")[0], path, line)
+
+    base = {}
+    if since is not None and cache is not None and not is_module:
+        base = cache.index(root)
+        if ignore is not None:
+            # The cache may hold a scan made with other ignore rules
+            base = {p: m for p, m in base.items() if not ignore.is_ignored_path(p)}
+        if not base:
+            sys.stderr.write(
+                f"WARNING: No cached scan of {root} to compare against {since}, "
+                "scanning every file\n"
+            )
+    scanned_at = cache.scanned_at(root) if base else None
+    if base and scanned_at is None:
+        sys.stderr.write(
+            f"WARNING: The cached scan of {root} doesn't record the commit it was "
+            "made at, scanning every file\n"
+        )
+        base = {}
+    if base:
+        commit, changed_before = scanned_at
+        try:
+            if requtils.git_commit(root, since) != commit:
+                sys.stderr.write(
+                    f"WARNING: The cached scan of {root} was made at {commit[:12]}, "
+                    f"not {since}, comparing against it instead\n"
+                )
+            # Files that differed from the commit when they were cached too
+            changed = requtils.git_changed_files(root, commit) | changed_before
+        except requtils.GitError as err:
+            sys.stderr.write(
+                f"WARNING: Unable to find the files changed since {since} ({err}), "
+                "scanning every file\n"
+            )
+            base = {}
+    full_scan = not (is_module or base)
     if is_module:
-        source_files = [source]
+        source_files = iter([root])
+    elif full_scan:
+        source_files = requtils.iter_source_files(root, projects, ignore)
     else:
-        source_files = list(source.rglob("*.[Pp][Yy]"))
-
-    imports = []
-    for file_ in source_files:
-        with file_.open() as f:
-            lines = f.readlines()
-        for line in lines:
-            module = requtils.scan_for_imports(line)
-            if module:
-                imports.append(module)
-
-    # Now we want to clean out the imports that we have
-    # 1. Eliminate the imports which start with `.` These are relative
-    #   imports, and so don't matter for pip requirements
-    # 2. Split imports on `.` we only want the top level module name
+        cache.remove(p for p in changed if not os.path.isfile(p))
+        for path, modules in base.items():
+            if path not in changed:
+                add_imports(path, modules)
+        source_files = (
+            p
+            for p in changed
+            if requtils.is_source_file(p)
+            and os.path.isfile(p)
+            and not (ignore is not None and ignore.is_ignored_path(p))
+        )
+
+    def uncached_files():
+        for path in requtils.timed(source_files, stats, "walk"):
+            if cache is None:
+                yield path
+                continue
+            seen.add(path)
+            stat = os.stat(path)
+            modules = cache.get(path, stat)
+            if modules is None:
+                pending[path] = stat
+                yield path
+            else:
+                if stats is not None:
+                    stats.count("files_cached")
+                add_imports(path, modules)
+
+    for path, modules in requtils.scan_files(
+        uncached_files(), jobs=jobs, parser=parser, stats=stats
+    ):
+        if cache is not None:
+            cache.put(path, pending.pop(path), modules)
+        add_imports(path, modules)
+
+    if cache is not None:
+        if full_scan:
+            cache.prune(root, seen)
+        if full_scan and not is_module:
+            _record_commit(cache, root)
+        elif base:
+            # The files scanned now may differ from the commit too
+            cache.set_scanned_at(root, commit, changed)
+        cache.flush()
+
+    # Now we want to clean out the rest of the imports that we have
     # 3. Remove STD LIB imports
     # 4. Remove imports whose name begins with the same name as `source` these
     #   are local modules, not modules being installed from pip
     # 5. Rename imports who have an Alias record
-    imports = [m for m in imports if not m.startswith(".")]
-    imports = [m.split(".")[0] for m in imports]
-    imports = [m for m in imports if m not in STD_LIBS]
-    imports = set(imports)
-
+    # Done in a single pass over the imports, each is a constant time lookup
+    std_libs = (
+        STD_LIBS if python_version is None else module_index.std_libs(python_version)
+    )
     source_module = source.resolve().parent.stem if is_module else source.stem
-    imports.discard(source_module)
-    for import_name, install_name in aliases.items():
-        if import_name in imports:
-            imports.remove(import_name)
-            imports.add(install_name)
+    for name in list(imports):
+        if name in std_libs or name == source_module:
+            imports.discard(name)
+            continue
+        install_name = aliases.get(name) or aliases.get(normalize_alias(name))
+        if install_name:
+            imports.rename(name, install_name)
 
     return imports
 
@@ -1,15 +1,33 @@
 """Real Req Utilities"""
+import itertools
+import os
 import re
 import sys
-import subprocess
+import time
 import typing
 from . import dependency_tree as dep_graph
+from . import ignore as ignore_rules
+from . import index_cache
+from . import metadata
+from . import readers
+from . import scanners
+from .provenance import Imports, ImportIndex
+from .stats import Stats, phase, timed
 
 
 IMPORT_RE = re.compile(
     r"(from )?(?(1)(?P<from>[a-zA-Z0-9._]*)|import (?P<import>[a-zA-Z0-9+._]*))"
 )
 PIP_SHOW_SEP = "\n---\n"
+# `pip --version` names the directory pip is installed in
+PIP_VERSION_RE = re.compile(r"pip \S+ from (?P<location>.+) \(python [^)]*\)")
+BACKENDS = ("pip", "metadata")
+PARSERS = ("regex", "ast", "mmap")
+# Files that mark the root directory of a project
+PROJECT_FILES = ("setup.py", "pyproject.toml")
+_CHUNKSIZE = 64
+# Most packages looked up by one call of a concurrent resolver
+_SHOW_CHUNKSIZE = 32
 
 
 class ParsedShowOutput(typing.NamedTuple):
@@ -31,35 +49,452 @@ def scan_for_imports(line):
         return ""
 
 
+def scan_file(path, parser: str = "regex") -> Imports:
+    """Scans the file at path, returning the modules it imports
+
+    Each module is paired with the number of the line that imports it, a module
+    imported on several lines appears once for each line.
+
+    The regex parser reads the file a line at a time, so it is never held in
+    memory. The mmap parser finds the same imports, but searches the raw bytes
+    of the file in one pass. The ast parser is more accurate, but falls back to
+    the regex parser for files that can't be parsed.
+
+    Files that aren't plain source (e.g. notebooks) are read by their reader
+    from `readers.READERS`, and always matched a line at a time.
+    """
+    reader = readers.get_reader(path) or readers.read_text
+    if reader is not readers.read_text:
+        return _match_lines(reader(path))
+    if parser == "mmap":
+        return scanners.scan_mmap(path)
+    if parser == "ast":
+        imports = scanners.scan_ast(path)
+        if imports is not None:
+            return imports
+    return _match_lines(readers.read_text(path))
+
+
+def _match_lines(lines: typing.Iterable[typing.Tuple[int, str]]) -> Imports:
+    imports = []
+    for lineno, line in lines:
+        module = scan_for_imports(line)
+        if module:
+            imports.append((module, lineno))
+    return imports
+
+
+def iter_source_files(
+    root,
+    projects: typing.Optional[typing.List[str]] = None,
+    ignore: typing.Optional[ignore_rules.Ignore] = None,
+) -> typing.Iterator[str]:
+    """Walks the directory tree at root, yielding the path of each python file
+
+    Like `pathlib.Path.rglob`, symlinks to directories are not followed. When
+    projects is given, every directory holding one of `PROJECT_FILES` is
+    appended to it as the tree is walked.
+
+    With ignore (whose root must be root), ignored files are skipped, and
+    ignored directories are never entered.
+    """
+    root = os.fspath(root)
+    stack = [(root, ignore.rules if ignore is not None else ())]
+    while stack:
+        directory, rules = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        if ignore is not None:
+            rules = ignore.enter(directory, [e.name for e in entries], rules)
+            if rules is None:
+                continue
+        is_project = False
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if not (rules and ignore_rules.is_ignored(rules, entry.path, True)):
+                    stack.append((entry.path, rules))
+                continue
+            if projects is not None and entry.name in PROJECT_FILES:
+                is_project = True
+            if (
+                is_source_file(entry.name)
+                and entry.is_file()
+                and not (rules and ignore_rules.is_ignored(rules, entry.path, False))
+            ):
+                yield entry.path
+        if is_project:
+            projects.append(directory)
+
+
+def is_source_file(path: str) -> bool:
+    """Tests if path is a source file with a reader, by its name"""
+    return readers.get_reader(path) is not None
+
+
+def git_changed_files(root: str, ref: str) -> typing.Set[str]:
+    """Get the files under root that were changed, added or deleted since ref
+
+    Includes uncommitted changes and untracked files. Renamed files are
+    reported as both deleted and added. Returns absolute paths. Raises GitError
+    if root isn't in a git repository, or ref doesn't exist.
+    """
+    toplevel = _git(root, "rev-parse", "--show-toplevel").strip("\n")
+    changed = _git(
+        toplevel, "diff", "--name-only", "--no-renames", "-z", ref, "--", root
+    )
+    untracked = _git(
+        toplevel, "ls-files", "--others", "--exclude-standard", "-z", "--", root
+    )
+    return {
+        os.path.realpath(os.path.join(toplevel, path))
+        for path in (changed + untracked).split("\0")
+        if path
+    }
+
+
+def git_commit(root: str, ref: str = "HEAD") -> str:
+    """Get the id of the commit ref points to, in the repository of root"""
+    return _git(root, "rev-parse", "--verify", ref + "^{commit}").strip()
+
+
+class GitError(Exception):
+    """Raised when git can't be run, or fails (e.g. for an unknown ref)"""
+
+
+def _git(cwd: str, *args: str) -> str:
+    import subprocess
+
+    try:
+        results = subprocess.run(
+            ["git"] + list(args),
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+        )
+    except FileNotFoundError:
+        raise GitError("git is not installed")
+    except subprocess.CalledProcessError as err:
+        message = err.stderr.decode(errors="replace").strip().splitlines()
+        raise GitError(message[0] if message else f"git {args[0]} failed")
+    return results.stdout.decode()
+
+
+def scan_files(
+    paths: typing.Iterable[str],
+    jobs: int = 1,
+    parser: str = "regex",
+    stats: typing.Optional[Stats] = None,
+) -> typing.Iterator[typing.Tuple[str, Imports]]:
+    """Scans every file in paths, yielding each path with the imports found in it
+
+    With more than one job the files are split into chunks, which are scanned in
+    a pool of worker processes. A job count of 0 uses every CPU. Only a few
+    chunks per worker are queued at a time, so paths is consumed lazily.
+
+    With stats, the files scanned, bytes read and imports matched are counted,
+    and the time spent reading and matching files is the phase `parse`. Workers
+    count and time their own chunks, and return them with the results, the time
+    of every worker is added up.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        for path in paths:
+            start = time.perf_counter()
+            imports = scan_file(path, parser)
+            if stats is not None:
+                stats.add_time("parse", time.perf_counter() - start)
+                stats.update(_scan_counters([(path, imports)]))
+            yield path, imports
+        return
+    import concurrent.futures
+
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        in_flight = set()
+        for chunk in _chunked(paths, _CHUNKSIZE):
+            in_flight.add(pool.submit(_scan_chunk, chunk, parser, stats is not None))
+            # Several chunks per worker keeps them busy when file sizes are uneven
+            if len(in_flight) >= jobs * 4:
+                done, in_flight = concurrent.futures.wait(
+                    in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    yield from _chunk_results(future, stats)
+        for future in concurrent.futures.as_completed(in_flight):
+            yield from _chunk_results(future, stats)
+
+
+def _scan_chunk(
+    paths: typing.List[str], parser: str, count: bool = False
+) -> typing.Tuple[
+    typing.List[typing.Tuple[str, Imports]],
+    typing.Optional[typing.Dict[str, int]],
+    float,
+]:
+    start = time.perf_counter()
+    results = [(path, scan_file(path, parser)) for path in paths]
+    elapsed = time.perf_counter() - start
+    return results, _scan_counters(results) if count else None, elapsed
+
+
+def _chunk_results(
+    future: "concurrent.futures.Future", stats: typing.Optional[Stats]
+) -> typing.List[typing.Tuple[str, Imports]]:
+    results, counters, elapsed = future.result()
+    if stats is not None and counters:
+        stats.add_time("parse", elapsed)
+        stats.update(counters)
+    return results
+
+
+def _scan_counters(
+    results: typing.List[typing.Tuple[str, Imports]],
+) -> typing.Dict[str, int]:
+    return {
+        "files_scanned": len(results),
+        "bytes_read": sum(os.path.getsize(path) for path, _ in results),
+        "imports_matched": sum(len(imports) for _, imports in results),
+    }
+
+
+def _chunked(iterable: typing.Iterable, size: int) -> typing.Iterator[list]:
+    iterator = iter(iterable)
+    chunk = list(itertools.islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, size))
+
+
 def build_dep_list(pkgs):
     """Builds list of dependencies"""
     return build_dep_tree(pkgs).nodes()
 
 
-def build_dep_tree(pkgs: typing.List[str]) -> dep_graph.DependencyGraph:
-    pkgs_ = set(pkgs)
-    dependencies = dep_graph.DependencyGraph()
+def build_dep_tree(
+    pkgs: typing.List[str],
+    index: typing.Optional["Index"] = None,
+    stats: typing.Optional[Stats] = None,
+    jobs: int = 1,
+) -> dep_graph.DependencyGraph:
+    """Builds the dependency graph of pkgs, looking up metadata in index
+
+    The index defaults to querying pip. Each package is looked up once, names
+    are compared normalized (PEP 503), so `Foo_Bar` and `foo-bar` are the same
+    package. With stats, the rounds of the breadth first search and the
+    packages looked up are counted.
+
+    With more than one job, packages are looked up concurrently instead (see
+    `_build_dep_tree_concurrent`). A job count of 0 uses every CPU.
+    """
+    index = index if index is not None else PipIndex()
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1:
+        return _build_dep_tree_concurrent(pkgs, index, stats, jobs)
+    visited: typing.Set[str] = set()
+    pkgs_ = _unvisited(pkgs, visited)
+    found: typing.List[ParsedShowOutput] = []
     while pkgs_:
+        if stats is not None:
+            stats.count("bfs_rounds")
+            stats.count("packages_looked_up", len(pkgs_))
 
-        results = pip_show(pkgs_)
-        if results is None:
+        results = index.show(pkgs_)
+        if not results:
             break
 
+        found.extend(results)
         found_deps = set()
-
-        for out in results.stdout.decode().split(PIP_SHOW_SEP):
-            p = get_deps_from_output(out)
-            dependencies.add_node(p.name)
-            for dep in p.deps:
-                dependencies.add_dependency(dep, p.name)
+        for p in results:
             found_deps |= set(p.deps)
 
-        # Clean up pkgs_ to only be new dependencies that need to be searched
-        pkgs_ = found_deps - pkgs_
+        # Only dependencies that weren't looked up in any earlier round, so
+        # shared dependencies and cycles are never looked up again
+        pkgs_ = _unvisited(found_deps, visited)
+    return _graph_of(found)
+
+
+def _graph_of(found: typing.Iterable[ParsedShowOutput]) -> dep_graph.DependencyGraph:
+    """The dependency graph of the packages found by an index
+
+    Requirements may spell a package differently than its metadata does (e.g.
+    `jinja2` for `Jinja2`), so dependencies are renamed to the name the index
+    returned for them, and each package is a single node. Dependencies that
+    weren't found keep the spelling of the first requirement on them.
+    """
+    found = list(found)
+    names = {metadata.normalize_name(p.name): p.name for p in found}
+    dependencies = dep_graph.DependencyGraph()
+    for p in found:
+        dependencies.add_node(p.name)
+        for dep in p.deps:
+            name = names.setdefault(metadata.normalize_name(dep), dep)
+            dependencies.add_dependency(name, p.name)
     return dependencies
 
 
-def pip_show(pkgs_: typing.Set[str]) -> typing.Optional[subprocess.CompletedProcess]:
+def _unvisited(
+    names: typing.Iterable[str], visited: typing.Set[str]
+) -> typing.Set[str]:
+    """The names not in visited, which are then added to it
+
+    Visited holds normalized names, and only one spelling of each is returned.
+    """
+    new = set()
+    for name in names:
+        key = metadata.normalize_name(name)
+        if key not in visited:
+            visited.add(key)
+            new.add(name)
+    return new
+
+
+def _build_dep_tree_concurrent(
+    pkgs: typing.Iterable[str],
+    index: "Index",
+    stats: typing.Optional[Stats],
+    jobs: int,
+) -> dep_graph.DependencyGraph:
+    """Builds the dependency graph of pkgs, with up to jobs lookups at once
+
+    Packages to look up are split into chunks, so a large set of packages is
+    spread over every job. The lookups run in a pool of threads, which suits
+    indexes that wait on a subprocess (like `pip show`). There are no rounds,
+    the dependencies found by a chunk are looked up as soon as it finishes,
+    while other chunks are still running. Each package is only looked up once.
+    """
+    import concurrent.futures
+
+    found: typing.List[ParsedShowOutput] = []
+    visited: typing.Set[str] = set()
+    # Lookups are timed in the phase the graph is built in, not at the top
+    show = stats.bind(index.show) if stats is not None else index.show
+    with concurrent.futures.ThreadPoolExecutor(jobs) as pool:
+
+        def submit(names: typing.Set[str]) -> typing.Set[concurrent.futures.Future]:
+            if stats is not None:
+                stats.count("packages_looked_up", len(names))
+            # Enough chunks to keep every job busy, but not one per package,
+            # as each call has a fixed cost (e.g. starting pip)
+            size = min(_SHOW_CHUNKSIZE, -(-len(names) // jobs))
+            return {pool.submit(show, chunk) for chunk in _chunked(sorted(names), size)}
+
+        pkgs = _unvisited(pkgs, visited)
+        in_flight = submit(pkgs) if pkgs else set()
+        while in_flight:
+            done, in_flight = concurrent.futures.wait(
+                in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            found_deps = set()
+            for future in done:
+                for p in future.result():
+                    found.append(p)
+                    found_deps.update(p.deps)
+            found_deps = _unvisited(found_deps, visited)
+            if found_deps:
+                in_flight |= submit(found_deps)
+    return _graph_of(found)
+
+
+class PipIndex:
+    """Index of installed packages that queries pip
+
+    `pip freeze` is only run once, the first time versions are requested. With
+    stats, the calls to pip are counted and timed.
+    """
+
+    def __init__(self, stats: typing.Optional[Stats] = None):
+        self._versions: typing.Optional[typing.Dict[str, str]] = None
+        self._stats = stats
+
+    def show(self, pkgs_: typing.Set[str]) -> typing.List[ParsedShowOutput]:
+        """Look up pkgs with `pip show`"""
+        if self._stats is not None:
+            self._stats.count("pip_show_calls")
+        with phase(self._stats, "pip show"):
+            results = pip_show(pkgs_)
+        if results is None:
+            return []
+        return [
+            get_deps_from_output(out)
+            for out in results.stdout.decode().split(PIP_SHOW_SEP)
+        ]
+
+    def versions(self, pkgs: typing.Iterable[str]) -> typing.Dict[str, str]:
+        """Get the `pip freeze` line of the installed pkgs, keyed by name"""
+        if self._versions is None:
+            import subprocess
+
+            if self._stats is not None:
+                self._stats.count("pip_freeze_calls")
+            with phase(self._stats, "pip freeze"):
+                results = subprocess.run(
+                    ["pip", "freeze"], stdout=subprocess.PIPE, check=True
+                )
+            self._versions = parse_versions(results.stdout)
+        return {p: self._versions[p] for p in pkgs if p in self._versions}
+
+
+def pip_site_packages() -> typing.Optional[str]:
+    """The directory of the packages that the `pip` PipIndex runs manages
+
+    That pip may belong to another environment than realreq (e.g. when realreq
+    is installed with pipx), it is found with `pip --version`. None is returned
+    if pip can't be run.
+    """
+    import subprocess
+
+    try:
+        results = subprocess.run(
+            ["pip", "--version"], stdout=subprocess.PIPE, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    match = PIP_VERSION_RE.match(results.stdout.decode())
+    return os.path.dirname(match.group("location")) if match else None
+
+
+# An Index looks up metadata of installed packages, it provides
+# `show(pkgs) -> Sequence` of objects with `name` and `deps` attributes, and
+# `versions(pkgs) -> Dict[str, str]` mapping names to requirement specifiers.
+Index = typing.Union[PipIndex, metadata.DistributionIndex, index_cache.CachedIndex]
+
+
+def default_backend() -> str:
+    """The backend used when none is given
+
+    Reading metadata directly doesn't start any subprocesses, but it can only
+    read the environment realreq runs in. When the `pip` on the `PATH` belongs
+    to another environment (e.g. realreq is installed with pipx, or outside of
+    an active virtual environment), pip is asked instead.
+    """
+    import shutil
+    import sysconfig
+
+    pip = shutil.which("pip")
+    if pip is None:
+        return "metadata"
+    here = os.path.realpath(sysconfig.get_path("scripts"))
+    there = os.path.realpath(os.path.dirname(pip))
+    return "metadata" if os.path.normcase(here) == os.path.normcase(there) else "pip"
+
+
+def get_index(backend: str, stats: typing.Optional[Stats] = None) -> Index:
+    """Get the index of installed packages for the given backend"""
+    if backend == "pip":
+        return PipIndex(stats)
+    elif backend == "metadata":
+        return metadata.DistributionIndex(stats=stats)
+    raise ValueError(f"Unknown metadata backend: {backend}")
+
+
+def pip_show(
+    pkgs_: typing.Set[str],
+) -> typing.Optional["subprocess.CompletedProcess"]:
+    import subprocess
+
     try:
         return subprocess.run(
             [
@@ -74,7 +509,7 @@ def pip_show(pkgs_: typing.Set[str]) -> typing.Optional[subprocess.CompletedProc
         return handle_pip_show_error(err)
 
 
-def handle_pip_show_error(err: subprocess.CalledProcessError):
+def handle_pip_show_error(err: "subprocess.CalledProcessError"):
     err_message = err.stderr.decode()
     if err_message.startswith("WARNING: Package(s) not found: "):
         sys.stderr.write(err_message)
@@ -96,12 +531,10 @@ def get_deps_from_output(out: str) -> ParsedShowOutput:
     return ParsedShowOutput(name=name, deps=deps)
 
 
-def get_dependency_versions(dependencies):
+def get_dependency_versions(dependencies, index: typing.Optional[Index] = None):
     """Gets versions of dependencies"""
-    results = subprocess.run(["pip", "freeze"], stdout=subprocess.PIPE, check=True)
-    versions = parse_versions(results.stdout)
-    dep_ver = dict(filter(lambda i: i[0] in dependencies, versions.items()))
-    return dep_ver
+    index = index if index is not None else PipIndex()
+    return index.versions(dependencies)
 
 
 def parse_versions(freeze_out: bytes) -> typing.Dict[str, str]:
@@ -114,5 +547,3 @@ def parse_versions(freeze_out: bytes) -> typing.Dict[str, str]:
             dep, _ = line.split(" ", maxsplit=1)
         versions[dep] = line
     return versions
-
-    deps: typing.List[str]
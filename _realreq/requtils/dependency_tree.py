@@ -1,8 +1,17 @@
 """Implementation of a Dependency Tree structure"""
+import array
+import bisect
+import collections
+import collections.abc
+import sys
 import typing
 
+from . import metadata
+
 
 class _Dependency:
+    __slots__ = ("name", "dependencies", "dependants")
+
     def __init__(
         self,
         name: str,
@@ -17,7 +26,188 @@ class _Dependency:
         self.dependants, self.dependencies = self.dependencies, self.dependants
 
 
-class DependencyGraph:
+class _GraphAlgorithms:
+    """Graph algorithms shared by the dependency graphs
+
+    Relies on `nodes`, `get_dependencies` and `get_dependants`, and a `_closures`
+    attribute that is reset to None whenever the graph changes.
+    """
+
+    __slots__ = ()
+
+    def topological_order(self) -> typing.List[str]:
+        """Return every node, with each node placed after its dependencies
+
+        Nodes in a dependency cycle (or depending on one) can't be strictly
+        ordered, they are placed after all other nodes, with each cycle after
+        its dependencies.
+        """
+        remaining = {name: len(self.get_dependencies(name)) for name in self.nodes()}
+        ready = collections.deque(
+            sorted(n for n, count in remaining.items() if not count)
+        )
+        order = []
+        while ready:
+            name = ready.popleft()
+            order.append(name)
+            for dependant in sorted(self.get_dependants(name)):
+                remaining[dependant] -= 1
+                if not remaining[dependant]:
+                    ready.append(dependant)
+        if len(order) < len(remaining):
+            ordered = set(order)
+            for component in self.strongly_connected_components():
+                order.extend(n for n in component if n not in ordered)
+        return order
+
+    def strongly_connected_components(self) -> typing.List[typing.List[str]]:
+        """Return the strongly connected components of the graph
+
+        Every node of a component depends (indirectly) on every other node in
+        it. Components are returned with their dependencies before them.
+        """
+        # Iterative version of Tarjan's algorithm, so deep graphs can't
+        # overflow the stack
+        index: typing.Dict[str, int] = {}
+        lowlink: typing.Dict[str, int] = {}
+        stack: typing.List[str] = []
+        on_stack: typing.Set[str] = set()
+        components = []
+        for root in self.nodes():
+            if root in index:
+                continue
+            work = [(root, iter(sorted(self.get_dependencies(root))))]
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                name, children = work[-1]
+                for child in children:
+                    if child not in index:
+                        index[child] = lowlink[child] = len(index)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(sorted(self.get_dependencies(child)))))
+                        break
+                    if child in on_stack:
+                        lowlink[name] = min(lowlink[name], index[child])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[name])
+                    if lowlink[name] == index[name]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == name:
+                                break
+                        components.append(sorted(component))
+        return components
+
+    def cycles(self) -> typing.List[typing.List[str]]:
+        """Return every group of nodes that depend on each other"""
+        return [
+            component
+            for component in self.strongly_connected_components()
+            if len(component) > 1 or component[0] in self.get_dependencies(component[0])
+        ]
+
+    def transitive_dependencies(self, name: str) -> typing.FrozenSet[str]:
+        """Return every direct and indirect dependency of name
+
+        The closure of every node is computed on the first call, and reused
+        until the graph changes.
+        """
+        if self._closures is None:
+            self._closures = self._compute_closures()
+        try:
+            return self._closures[name]
+        except KeyError:
+            raise KeyError(f"Node {name} does not exist in the graph")
+
+    def subgraph(self, roots: typing.Iterable[str]) -> "DependencyGraph":
+        """Return the graph of roots and everything they depend on
+
+        Roots are matched to nodes by their normalized names, like `find`, so an
+        import of `flask` takes the node `Flask`. Roots that aren't in the graph
+        at all (packages that weren't found) are left out, as they are when
+        building the graph.
+        """
+        graph = DependencyGraph()
+        seen: typing.Set[str] = set()
+        nodes = self._normalized_names()
+        for root in roots:
+            node = nodes.get(metadata.normalize_name(root))
+            if node is None:
+                continue
+            names = self.transitive_dependencies(node) | {node}
+            for name in names - seen:
+                seen.add(name)
+                graph.add_node(name)
+                for dep in self.get_dependencies(name):
+                    graph.add_dependency(dep, name)
+        return graph
+
+    def find(self, name: str) -> typing.Optional[str]:
+        """Return the node named name, compared normalized (PEP 503)
+
+        So `import flask` finds the node `Flask`, None is returned if there is
+        no such node.
+        """
+        return self._normalized_names().get(metadata.normalize_name(name))
+
+    def why(
+        self, target: str, roots: typing.Iterable[str]
+    ) -> typing.Optional[typing.List[str]]:
+        """Return the shortest chain of dependencies from any of roots to target
+
+        The chain starts with the root and ends with target, None is returned
+        if no root depends on target. Names are compared normalized.
+        """
+        node = self.find(target)
+        if node is None:
+            raise KeyError(f"Node {target} does not exist in the graph")
+        roots = {metadata.normalize_name(root) for root in roots}
+        previous: typing.Dict[str, typing.Optional[str]] = {node: None}
+        queue = collections.deque([node])
+        while queue:
+            name = queue.popleft()
+            if metadata.normalize_name(name) in roots:
+                chain = [name]
+                while previous[chain[-1]] is not None:
+                    chain.append(previous[chain[-1]])
+                return chain
+            for dependant in sorted(self.get_dependants(name)):
+                if dependant not in previous:
+                    previous[dependant] = name
+                    queue.append(dependant)
+        return None
+
+    def _normalized_names(self) -> typing.Dict[str, str]:
+        return {metadata.normalize_name(name): name for name in self.nodes()}
+
+    def _compute_closures(self) -> typing.Dict[str, typing.FrozenSet[str]]:
+        closures: typing.Dict[str, typing.FrozenSet[str]] = {}
+        # Components come with their dependencies first, so the closure of
+        # every dependency outside the component is already known
+        for component in self.strongly_connected_components():
+            members = set(component)
+            closure = set()
+            for name in component:
+                for dep in self.get_dependencies(name):
+                    closure.add(dep)
+                    if dep not in members:
+                        closure |= closures[dep]
+            frozen = frozenset(closure)
+            for name in component:
+                closures[name] = frozen
+        return closures
+
+
+class DependencyGraph(_GraphAlgorithms):
     """
     A dependency graph that holds information on all dependencies and their connections.
 
@@ -26,6 +216,7 @@ class DependencyGraph:
 
     def __init__(self):
         self._nodes: typing.dict[str, _Dependency] = {}
+        self._closures = None
 
     def __iter__(self):
         for k in self._nodes.keys():
@@ -37,10 +228,12 @@ class DependencyGraph:
 
     def add_node(self, name: str):
         """Add a Node to the dependency Graph"""
+        self._closures = None
         self._nodes.setdefault(name, _Dependency(name))
 
     def add_dependency(self, name: str, dependant: str):
         """Add the name as a dependency of the given dependant"""
+        self._closures = None
         requirement = self._nodes.setdefault(name, _Dependency(name))
         dep = self._nodes.setdefault(dependant, _Dependency(dependant))
 
@@ -68,4 +261,134 @@ class DependencyGraph:
         """Inverts the relationships in the graph"""
         for deps in self._nodes.values():
             deps.invert()
+        self._closures = None
+        return self
+
+    def compact(self) -> "CompactDependencyGraph":
+        """Return a compact, read only copy of the graph"""
+        return CompactDependencyGraph.from_graph(self)
+
+
+class _Adjacency:
+    """Adjacency lists of every node, stored in compressed sparse row format
+
+    The neighbours of node i are `edges[offsets[i]:offsets[i + 1]]`.
+    """
+
+    __slots__ = ("offsets", "edges")
+
+    def __init__(self, neighbours: typing.Iterable[typing.Iterable[int]]):
+        self.offsets = array.array("I", [0])
+        self.edges = array.array("I")
+        for ids in neighbours:
+            self.edges.extend(sorted(ids))
+            self.offsets.append(len(self.edges))
+
+
+class _NodeNames(collections.abc.Set):
+    """The names of the neighbours of a node in a compact graph
+
+    A read only view of its adjacency list, which is neither copied nor turned
+    into a set. Membership is a binary search, as each list is sorted.
+    """
+
+    __slots__ = ("_edges", "_start", "_end", "_names", "_ids")
+
+    def __init__(
+        self,
+        adjacency: _Adjacency,
+        node: int,
+        names: typing.List[str],
+        ids: typing.Dict[str, int],
+    ):
+        self._edges = adjacency.edges
+        self._start = adjacency.offsets[node]
+        self._end = adjacency.offsets[node + 1]
+        self._names = names
+        self._ids = ids
+
+    @classmethod
+    def _from_iterable(cls, iterable: typing.Iterable[str]) -> typing.FrozenSet[str]:
+        # The results of set operations are plain sets
+        return frozenset(iterable)
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def __iter__(self) -> typing.Iterator[str]:
+        names = self._names
+        for i in range(self._start, self._end):
+            yield names[self._edges[i]]
+
+    def __contains__(self, name) -> bool:
+        node = self._ids.get(name)
+        if node is None:
+            return False
+        i = bisect.bisect_left(self._edges, node, self._start, self._end)
+        return i < self._end and self._edges[i] == node
+
+    def __repr__(self) -> str:
+        return "{0}({1})".format(type(self).__name__, sorted(self))
+
+
+class CompactDependencyGraph(_GraphAlgorithms):
+    """
+    A read only dependency graph, for graphs with many nodes.
+
+    Node names are interned and mapped to integer ids, and the edges in each
+    direction are stored in flat arrays rather than a set per node. Inverting
+    the graph swaps the two directions, without touching any nodes.
+    """
+
+    __slots__ = ("_names", "_ids", "_dependencies", "_dependants", "_closures")
+
+    def __init__(
+        self,
+        names: typing.List[str],
+        dependencies: _Adjacency,
+        dependants: _Adjacency,
+    ):
+        self._names = [sys.intern(name) for name in names]
+        self._ids = {name: i for i, name in enumerate(self._names)}
+        self._dependencies = dependencies
+        self._dependants = dependants
+        self._closures = None
+
+    @classmethod
+    def from_graph(cls, graph: DependencyGraph) -> "CompactDependencyGraph":
+        names = graph.nodes()
+        ids = {name: i for i, name in enumerate(names)}
+        return cls(
+            names,
+            _Adjacency(
+                [ids[d] for d in graph.get_dependencies(name)] for name in names
+            ),
+            _Adjacency([ids[d] for d in graph.get_dependants(name)] for name in names),
+        )
+
+    def __iter__(self):
+        for k in self._names:
+            yield (k, self.get_dependencies(k))
+
+    def nodes(self):
+        """Return name of all nodes in the graph"""
+        return list(self._names)
+
+    def get_dependencies(self, name) -> typing.Collection[str]:
+        """Get a list of dependencies"""
+        return self._get_names(self._dependencies, name)
+
+    def get_dependants(self, name) -> typing.Collection[str]:
+        return self._get_names(self._dependants, name)
+
+    def _get_names(self, adjacency: _Adjacency, name) -> _NodeNames:
+        node = self._ids.get(name)
+        if node is None:
+            raise KeyError(f"Node {name} does not exist in the graph")
+        return _NodeNames(adjacency, node, self._names, self._ids)
+
+    def invert(self):
+        """Inverts the relationships in the graph"""
+        self._dependencies, self._dependants = self._dependants, self._dependencies
+        self._closures = None
         return self
@@ -0,0 +1,247 @@
+"""Rules for the files and directories a source walk skips
+
+Patterns follow the syntax of `.gitignore` files: `*`, `?` and `[...]` match
+within a path component, `**` matches across them, a trailing `/` only matches
+directories, a pattern with a `/` (other than a trailing one) is relative to
+the directory it is defined in, other patterns match at any depth, and `!`
+includes paths excluded by an earlier pattern again. Each pattern is compiled
+to a regular expression once.
+"""
+import os
+import re
+import typing
+
+# Directories that never hold source of the project being scanned
+DEFAULT_EXCLUDES = (
+    ".git/",
+    ".hg/",
+    ".svn/",
+    ".tox/",
+    ".nox/",
+    ".venv/",
+    "node_modules/",
+    "build/",
+    "__pycache__/",
+)
+# Marks the root directory of a virtual environment, whatever it is named
+VENV_MARKER = "pyvenv.cfg"
+IGNORE_FILE = ".gitignore"
+
+
+class Rules:
+    """Compiled patterns, matched against paths relative to base"""
+
+    __slots__ = ("base", "_offset", "_patterns", "_files", "_dirs")
+
+    def __init__(self, patterns: typing.Iterable[str], base: str):
+        self.base = base
+        # Paths in base start with base and a separator
+        self._offset = len(os.path.join(base, ""))
+        self._patterns = [p for p in map(_translate, patterns) if p is not None]
+        self._files = self._dirs = None
+        if not any(negate for _, negate, _ in self._patterns):
+            # Without negations, any match ignores a path, so all of the
+            # patterns are matched at once
+            self._files = _combine(
+                r for r, _, dir_only in self._patterns if not dir_only
+            )
+            self._dirs = _combine(r for r, _, _ in self._patterns)
+
+    @classmethod
+    def from_file(cls, path: str) -> "Rules":
+        """Read the patterns of an ignore file, relative to its directory"""
+        try:
+            with open(path, encoding="utf-8", errors="replace") as fi:
+                lines = fi.read().splitlines()
+        except OSError:
+            lines = []
+        return cls(lines, os.path.dirname(path))
+
+    def __bool__(self) -> bool:
+        return bool(self._patterns)
+
+    def relative(self, path: str) -> str:
+        """The path of a file in base relative to it, separated by `/`"""
+        relative = path[self._offset :]
+        return relative if os.sep == "/" else relative.replace(os.sep, "/")
+
+    def match(self, path: str, is_dir: bool) -> typing.Optional[bool]:
+        """Match path, relative to base and separated by `/`, against the patterns
+
+        Returns True if path is ignored, False if it is included again, and None
+        if no pattern matches it.
+        """
+        if self._dirs is not None:
+            regex = self._dirs if is_dir else self._files
+            return True if regex is not None and regex.match(path) else None
+        for regex, negate, dir_only in reversed(self._patterns):
+            if (is_dir or not dir_only) and regex.match(path):
+                return not negate
+        return None
+
+
+class Ignore:
+    """Decides which files and directories a walk from root skips
+
+    Combines the default excludes, the given patterns (relative to root), and
+    the `.gitignore` file of each directory walked, which applies to the tree
+    below it. Later rules take precedence, so a `.gitignore` can include paths
+    excluded by the patterns above it again. With defaults, directories holding
+    a virtual environment are skipped too.
+    """
+
+    def __init__(
+        self,
+        root,
+        patterns: typing.Iterable[str] = (),
+        defaults: bool = True,
+        gitignore: bool = True,
+    ):
+        self.root = os.fspath(root)
+        self._prefix = os.path.join(self.root, "")
+        self._defaults = defaults
+        self._gitignore = gitignore
+        rules = Rules(
+            list(DEFAULT_EXCLUDES if defaults else ()) + list(patterns), self.root
+        )
+        self.rules: typing.Tuple[Rules, ...] = (rules,) if rules else ()
+        # The rules for the entries of each directory is_ignored_path has seen
+        self._entered: typing.Dict[str, typing.Optional[typing.Tuple[Rules, ...]]] = {}
+
+    def enter(
+        self,
+        directory: str,
+        names: typing.Collection[str],
+        rules: typing.Tuple[Rules, ...],
+    ) -> typing.Optional[typing.Tuple[Rules, ...]]:
+        """The rules for the entries of directory, extending its parent's rules
+
+        names are the entries of directory, None is returned if the whole
+        directory is skipped.
+        """
+        # The root is always walked, even when it is a virtual environment
+        if self._defaults and VENV_MARKER in names and directory != self.root:
+            return None
+        if self._gitignore and IGNORE_FILE in names:
+            found = Rules.from_file(os.path.join(directory, IGNORE_FILE))
+            if found:
+                return rules + (found,)
+        return rules
+
+    def is_ignored_path(self, path: str) -> bool:
+        """Tests if a walk from root skips the file at path, or a directory it is in
+
+        Reads the ignore files of the directories above path, each directory is
+        only looked at once, however many paths are in it.
+        """
+        # Paths under root, like the ones a walk yields, needn't be normalized
+        if not path.startswith(self._prefix):
+            relative = os.path.relpath(path, self.root)
+            if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+                return False
+            path = os.path.join(self.root, relative)
+        rules = self._rules_in(os.path.dirname(path))
+        return rules is None or is_ignored(rules, path, False)
+
+    def _rules_in(self, directory: str) -> typing.Optional[typing.Tuple[Rules, ...]]:
+        """The rules for the entries of directory, which is root or in it
+
+        None if directory, or a directory it is in, is skipped.
+        """
+        try:
+            return self._entered[directory]
+        except KeyError:
+            pass
+        if directory == self.root:
+            rules: typing.Optional[typing.Tuple[Rules, ...]] = self.rules
+        else:
+            rules = self._rules_in(os.path.dirname(directory))
+            if rules is not None and is_ignored(rules, directory, True):
+                rules = None
+        if rules is not None:
+            names = [
+                n
+                for n in (VENV_MARKER, IGNORE_FILE)
+                if os.path.exists(os.path.join(directory, n))
+            ]
+            rules = self.enter(directory, names, rules)
+        self._entered[directory] = rules
+        return rules
+
+
+def is_ignored(rules: typing.Tuple[Rules, ...], path: str, is_dir: bool) -> bool:
+    """Tests if path is ignored by rules, the last rule matching it wins"""
+    for rule in reversed(rules):
+        ignored = rule.match(rule.relative(path), is_dir)
+        if ignored is not None:
+            return ignored
+    return False
+
+
+def _combine(
+    regexes: typing.Iterable[typing.Pattern],
+) -> typing.Optional[typing.Pattern]:
+    patterns = [r.pattern for r in regexes]
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{p})" for p in patterns))
+
+
+def _translate(
+    pattern: str,
+) -> typing.Optional[typing.Tuple[typing.Pattern, bool, bool]]:
+    """Compile a pattern to a (regex, negated, only matches directories) tuple
+
+    Returns None for blank lines and comments.
+    """
+    pattern = pattern.rstrip(" ")
+    if not pattern or pattern.startswith("#"):
+        return None
+    negate = pattern.startswith("!")
+    if negate:
+        pattern = pattern[1:]
+    elif pattern.startswith("\\"):
+        # Escapes a leading `#` or `!`
+        pattern = pattern[1:]
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    if not pattern:
+        return None
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i) and i + 2 == len(pattern):
+            parts.append(".*")
+            i += 2
+        elif char == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif char == "?":
+            parts.append("[^/]")
+            i += 1
+        elif char == "[":
+            end = pattern.find("]", i + 2)
+            if end < 0:
+                parts.append(re.escape(char))
+                i += 1
+                continue
+            members = pattern[i + 1 : end]
+            if members.startswith("!"):
+                members = "^" + members[1:]
+            parts.append("[" + members.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif char == "\\" and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(char))
+            i += 1
+    prefix = "" if anchored else "(?:.*/)?"
+    return re.compile(prefix + "".join(parts) + r"\Z"), negate, dir_only
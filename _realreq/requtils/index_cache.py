@@ -0,0 +1,159 @@
+"""Persistent memo of package metadata lookups
+
+Lookups are only reused while the environment fingerprint they were made in
+matches, so installing, upgrading or removing a package discards them.
+"""
+import os
+import pathlib
+import sys
+import typing
+
+from . import metadata
+from .stats import Stats
+
+# Bump when the stored format changes, to discard old files
+FORMAT_VERSION = 1
+
+
+class CachedShowOutput(typing.NamedTuple):
+    name: str
+    deps: typing.List[str]
+
+
+class CachedIndex:
+    """Wraps an index of installed packages, remembering its answers in path
+
+    Provides the same `show` and `versions` methods as the index it wraps, but
+    only asks it about packages that aren't known yet. Call `save` to write
+    new answers to disk. With stats, the packages answered from the cache are
+    counted.
+    """
+
+    def __init__(
+        self,
+        index,
+        path: pathlib.Path,
+        fingerprint: str,
+        stats: typing.Optional[Stats] = None,
+    ):
+        self._index = index
+        self._path = pathlib.Path(path)
+        self._fingerprint = fingerprint
+        self._stats = stats
+        self._shown: typing.Dict[str, typing.Optional[list]] = {}
+        self._versions: typing.Dict[str, typing.Optional[list]] = {}
+        self._dirty = False
+        self._load()
+
+    def show(self, pkgs: typing.Iterable[str]) -> typing.List[CachedShowOutput]:
+        """Look up pkgs, asking the wrapped index only about unknown ones"""
+        pkgs = list(pkgs)
+        missing = [p for p in pkgs if metadata.normalize_name(p) not in self._shown]
+        if self._stats is not None:
+            self._stats.count("metadata_cache_hits", len(pkgs) - len(missing))
+        if missing:
+            self._dirty = True
+            for p in missing:
+                self._shown[metadata.normalize_name(p)] = None
+            for result in self._index.show(missing):
+                self._shown[metadata.normalize_name(result.name)] = [
+                    result.name,
+                    list(result.deps),
+                ]
+        found = (self._shown[metadata.normalize_name(p)] for p in pkgs)
+        return [CachedShowOutput(name, deps) for name, deps in _unique(found)]
+
+    def versions(self, pkgs: typing.Iterable[str]) -> typing.Dict[str, str]:
+        """Get the requirement specifiers of pkgs, asking only about unknown ones"""
+        pkgs = list(pkgs)
+        missing = [p for p in pkgs if p not in self._versions]
+        if missing:
+            self._dirty = True
+            found = {
+                metadata.normalize_name(name): [name, requirement]
+                for name, requirement in self._index.versions(missing).items()
+            }
+            for p in missing:
+                self._versions[p] = found.get(metadata.normalize_name(p))
+        return dict(_unique(self._versions[p] for p in pkgs))
+
+    def save(self):
+        """Write new answers to disk"""
+        if not self._dirty:
+            return
+        import json
+
+        data = {
+            "version": FORMAT_VERSION,
+            "fingerprint": self._fingerprint,
+            "show": self._shown,
+            "versions": self._versions,
+        }
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so readers never see a partial file
+        tmp = self._path.with_name(self._path.name + ".tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(str(tmp), str(self._path))
+        self._dirty = False
+
+    def _load(self):
+        import json
+
+        try:
+            data = json.loads(self._path.read_text())
+        except (OSError, ValueError):
+            return
+        if (data.get("version"), data.get("fingerprint")) != (
+            FORMAT_VERSION,
+            self._fingerprint,
+        ):
+            return
+        self._shown = data["show"]
+        self._versions = data["versions"]
+
+
+def cached_packages_distributions(
+    path: pathlib.Path,
+    fingerprint: str,
+    paths: typing.Optional[typing.Iterable[str]] = None,
+) -> typing.Dict[str, typing.List[str]]:
+    """The `metadata.packages_distributions` of the search paths, kept in path
+
+    The search paths default to `sys.path`, they are only read again once the
+    fingerprint of their environment changes.
+    """
+    import json
+
+    path = pathlib.Path(path)
+    try:
+        data = json.loads(path.read_text())
+        if (data.get("version"), data.get("fingerprint")) == (
+            FORMAT_VERSION,
+            fingerprint,
+        ):
+            return data["packages"]
+    except (OSError, ValueError):
+        pass
+    packages = metadata.packages_distributions(paths)
+    data = {
+        "version": FORMAT_VERSION,
+        "fingerprint": fingerprint,
+        "packages": packages,
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(str(tmp), str(path))
+    except OSError as err:
+        sys.stderr.write(f"WARNING: Unable to save module cache ({err})\n")
+    return packages
+
+
+def _unique(items: typing.Iterable[typing.Optional[list]]) -> typing.Iterator[list]:
+    """Drop missing and repeated answers"""
+    seen = set()
+    for item in items:
+        if item is not None and item[0] not in seen:
+            seen.add(item[0])
+            yield item
@@ -0,0 +1,31 @@
+"""Containers whose content is only loaded the first time they are used"""
+import collections.abc
+import typing
+
+
+class _Lazy:
+    __slots__ = ("_load", "_data")
+
+    def __init__(self, load: typing.Callable[[], typing.Any]):
+        self._load = load
+        self._data = None
+
+    def _get(self):
+        if self._data is None:
+            self._data = self._load()
+        return self._data
+
+    def __contains__(self, item) -> bool:
+        return item in self._get()
+
+    def __iter__(self):
+        return iter(self._get())
+
+    def __len__(self) -> int:
+        return len(self._get())
+
+
+class LazySet(_Lazy, collections.abc.Set):
+    """Read only set, whose content is returned by load"""
+
+    __slots__ = ()
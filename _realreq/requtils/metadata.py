@@ -0,0 +1,349 @@
+"""Read metadata of installed distributions directly from site-packages
+
+This is an in process alternative to calling `pip show`, it reads the
+`*.dist-info/METADATA` (or `*.egg-info/PKG-INFO`) files of the distributions
+found on the search path.
+"""
+import functools
+import os
+import re
+import sys
+import typing
+
+from .stats import Stats
+
+_NAME_RE = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+_NORMALIZE_RE = re.compile(r"[-_.]+")
+_METADATA_SUFFIXES = (".dist-info", ".egg-info")
+
+
+class Distribution(typing.NamedTuple):
+    name: str
+    version: str
+    deps: typing.List[str]
+    path: str
+    url: typing.Optional[str] = None
+    editable: bool = False
+
+    def requirement(self) -> str:
+        """The requirement specifier, in the format used by `pip freeze`"""
+        if self.editable and self.url:
+            url = self.url
+            if url.startswith("file://"):
+                url = url[len("file://") :]
+            return "-e {0}".format(url)
+        if self.url:
+            return "{0} @ {1}".format(self.name, self.url)
+        return "{0}=={1}".format(self.name, self.version)
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a distribution name as described in PEP 503"""
+    return _NORMALIZE_RE.sub("-", name).lower()
+
+
+def environment_fingerprint(paths: typing.Optional[typing.Iterable[str]] = None) -> str:
+    """Cheap fingerprint of the environment, it changes when packages change
+
+    Covers the interpreter prefix, the search paths, and the names and
+    modification times of the metadata directories in them. Other changes to a
+    search path (like saving a file in the working directory) don't change it.
+    No metadata files are read.
+    """
+    import hashlib
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(sys.prefix.encode())
+    for path in sys.path if paths is None else paths:
+        try:
+            entries = os.scandir(path or ".")
+        except OSError:
+            continue
+        digest.update("\0{0}".format(path).encode())
+        with entries:
+            listing = sorted(
+                (entry.name, entry.stat().st_mtime_ns)
+                for entry in entries
+                if entry.name.endswith(_METADATA_SUFFIXES)
+            )
+        for name, mtime_ns in listing:
+            digest.update("\0{0}\0{1}".format(name, mtime_ns).encode())
+    return digest.hexdigest()
+
+
+class DistributionIndex:
+    """Index of the distributions installed on the given search paths
+
+    The search paths are only listed once, metadata for a distribution is read
+    the first time it is requested. With stats, the distributions read are
+    counted.
+    """
+
+    def __init__(
+        self,
+        paths: typing.Optional[typing.Iterable[str]] = None,
+        stats: typing.Optional[Stats] = None,
+    ):
+        self._paths = list(sys.path if paths is None else paths)
+        self._stats = stats
+        self._locations: typing.Optional[typing.Dict[str, str]] = None
+        self._dists: typing.Dict[str, typing.Optional[Distribution]] = {}
+
+    def get(self, name: str) -> typing.Optional[Distribution]:
+        """Get the installed distribution with the given name"""
+        key = normalize_name(name)
+        if key not in self._dists:
+            location = self._get_locations().get(key)
+            if location and self._stats is not None:
+                self._stats.count("distributions_read")
+            self._dists[key] = read_distribution(location) if location else None
+        return self._dists[key]
+
+    def show(self, pkgs: typing.Iterable[str]) -> typing.List[Distribution]:
+        """Look up pkgs, mirroring the behaviour of `pip show`"""
+        found = []
+        missing = []
+        for pkg in pkgs:
+            dist = self.get(pkg)
+            if dist is None:
+                missing.append(pkg)
+            else:
+                found.append(dist)
+        if missing:
+            sys.stderr.write(
+                "WARNING: Package(s) not found: {0}\n".format(", ".join(missing))
+            )
+        return found
+
+    def versions(self, pkgs: typing.Iterable[str]) -> typing.Dict[str, str]:
+        """Get the requirement specifiers of the installed pkgs, keyed by name"""
+        dists = (self.get(pkg) for pkg in pkgs)
+        return {d.name: d.requirement() for d in dists if d is not None}
+
+    def _get_locations(self) -> typing.Dict[str, str]:
+        if self._locations is None:
+            self._locations = {}
+            for path in self._paths:
+                for key, location in _scan_path(path):
+                    # Like the import system, the first path entry wins
+                    self._locations.setdefault(key, location)
+        return self._locations
+
+
+def packages_distributions(
+    paths: typing.Optional[typing.Iterable[str]] = None,
+) -> typing.Dict[str, typing.List[str]]:
+    """Map top level import names to the distributions that provide them
+
+    The same data as `importlib.metadata.packages_distributions`, names are read
+    from `top_level.txt`, or inferred from the files listed in `RECORD`.
+    """
+    packages: typing.Dict[str, typing.List[str]] = {}
+    seen = set()
+    for path in sys.path if paths is None else paths:
+        for key, location in _scan_path(path):
+            # Like the import system, the first path entry wins
+            if key in seen:
+                continue
+            seen.add(key)
+            if location.endswith(".egg-info"):
+                headers = _read_headers(os.path.join(location, "PKG-INFO"))
+            else:
+                headers = _read_headers(os.path.join(location, "METADATA"))
+            if not headers.get("Name"):
+                continue
+            name = headers["Name"][0]
+            for module in _top_level_names(location):
+                dists = packages.setdefault(module, [])
+                if name not in dists:
+                    dists.append(name)
+    return packages
+
+
+def import_aliases(
+    packages: typing.Mapping[str, typing.List[str]],
+) -> typing.Dict[str, str]:
+    """Aliases from import names to the distribution providing them
+
+    Only import names provided by a single distribution, whose name differs
+    from the import name, need an alias.
+    """
+    aliases = {}
+    for module, dists in packages.items():
+        if len(dists) == 1 and normalize_name(dists[0]) != normalize_name(module):
+            aliases[module] = dists[0]
+    return aliases
+
+
+def _top_level_names(location: str) -> typing.Iterator[str]:
+    try:
+        with open(os.path.join(location, "top_level.txt"), encoding="utf-8") as fi:
+            # Nested packages are listed with a `/`, only the top level matters
+            names = {line.strip().split("/")[0] for line in fi}
+            yield from (name for name in names if name.isidentifier())
+            return
+    except OSError:
+        pass
+    yield from _record_names(os.path.join(location, "RECORD"))
+
+
+def _record_names(path: str) -> typing.Iterator[str]:
+    """Infer the top level import names from the installed files in RECORD"""
+    import csv
+    import importlib.machinery
+
+    suffixes = sorted(importlib.machinery.all_suffixes(), key=len, reverse=True)
+    try:
+        fi = open(path, encoding="utf-8", newline="")
+    except OSError:
+        return
+    names = set()
+    with fi:
+        for row in csv.reader(fi):
+            if not row:
+                continue
+            top, sep, _ = row[0].partition("/")
+            if not sep:
+                # A single module, e.g. `six.py` or `_speedups.cpython-311.so`
+                module = next((top[: -len(s)] for s in suffixes if top.endswith(s)), "")
+                top = module.partition(".")[0]
+            # Skips metadata (`*.dist-info`), scripts (`../../bin`), and caches
+            if top.isidentifier() and top != "__pycache__" and top not in names:
+                names.add(top)
+                yield top
+
+
+def _scan_path(path: str) -> typing.Iterator[typing.Tuple[str, str]]:
+    try:
+        entries = os.scandir(path or ".")
+    except OSError:
+        return
+    with entries:
+        for entry in entries:
+            if not entry.name.endswith(_METADATA_SUFFIXES):
+                continue
+            # Directory names are `{name}-{version}.dist-info`, with the
+            # name escaped so it can't contain a `-`
+            name = entry.name.rsplit(".", 1)[0].split("-", 1)[0]
+            yield normalize_name(name), entry.path
+
+
+def read_distribution(location: str) -> typing.Optional[Distribution]:
+    """Read the distribution metadata stored at location"""
+    if location.endswith(".egg-info"):
+        headers = _read_headers(os.path.join(location, "PKG-INFO"))
+        requires = _read_egg_requires(os.path.join(location, "requires.txt"))
+    else:
+        headers = _read_headers(os.path.join(location, "METADATA"))
+        requires = headers.get("Requires-Dist", [])
+    if not headers.get("Name"):
+        return None
+    deps = []
+    for req in requires:
+        dep = _requirement_name(req)
+        if dep and dep not in deps:
+            deps.append(dep)
+    url, editable = _read_direct_url(os.path.join(location, "direct_url.json"))
+    return Distribution(
+        name=headers["Name"][0],
+        version=headers.get("Version", [""])[0],
+        deps=deps,
+        path=location,
+        url=url,
+        editable=editable,
+    )
+
+
+def _read_direct_url(path: str) -> typing.Tuple[typing.Optional[str], bool]:
+    """Read the url a distribution was installed from (PEP 610), if any"""
+    import json
+
+    try:
+        with open(path, encoding="utf-8") as fi:
+            direct_url = json.load(fi)
+    except (OSError, ValueError):
+        return None, False
+    url = direct_url.get("url")
+    vcs_info = direct_url.get("vcs_info")
+    if url and vcs_info:
+        url = "{0}+{1}@{2}".format(vcs_info["vcs"], url, vcs_info["commit_id"])
+    editable = bool(direct_url.get("dir_info", {}).get("editable"))
+    return url, editable
+
+
+def _read_headers(path: str) -> typing.Dict[str, typing.List[str]]:
+    """Read the RFC 822 style headers of a metadata file
+
+    Only the headers are read, the description body (which can be large) is
+    never loaded.
+    """
+    headers: typing.Dict[str, typing.List[str]] = {}
+    try:
+        fi = open(path, encoding="utf-8", errors="replace")
+    except OSError:
+        return headers
+    with fi:
+        key = None
+        for line in fi:
+            if line in ("\n", "\r\n"):
+                break
+            if line[0] in " \t" and key is not None:
+                # Continuation line
+                headers[key][-1] += "\n" + line.strip()
+                continue
+            key, sep, value = line.partition(":")
+            if not sep:
+                key = None
+                continue
+            headers.setdefault(key, []).append(value.strip())
+    return headers
+
+
+def _read_egg_requires(path: str) -> typing.List[str]:
+    try:
+        fi = open(path, encoding="utf-8")
+    except OSError:
+        return []
+    requires = []
+    with fi:
+        for line in fi:
+            line = line.strip()
+            if line.startswith("["):
+                # Every section is either an extra or conditional on a marker
+                break
+            if line:
+                requires.append(line)
+    return requires
+
+
+def _requirement_name(requirement: str) -> typing.Optional[str]:
+    """Name of the requirement, if it applies to this environment"""
+    requirement, _, marker = requirement.partition(";")
+    if marker.strip() and not _marker_applies(marker.strip()):
+        return None
+    match = _NAME_RE.match(requirement)
+    return match.group(1) if match else None
+
+
+def _marker_applies(marker: str) -> bool:
+    """Evaluate an environment marker the way `pip show` does (no extras)"""
+    marker_cls = _marker_class()
+    if marker_cls is None:
+        # Without packaging we can't evaluate markers, so only drop extras
+        return "extra" not in marker
+    try:
+        return marker_cls(marker).evaluate({"extra": ""})
+    except Exception:
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def _marker_class():
+    try:
+        from packaging.markers import Marker
+    except ImportError:
+        try:
+            from pip._vendor.packaging.markers import Marker
+        except ImportError:
+            return None
+    return Marker
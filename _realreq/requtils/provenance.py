@@ -0,0 +1,103 @@
+"""Index of where each package is imported in the source"""
+import array
+import collections.abc
+import os
+import typing
+
+# The (module, line number) of each import statement found in a file
+Imports = typing.List[typing.Tuple[str, int]]
+
+
+class ImportIndex(collections.abc.Mapping):
+    """Maps the name of each package to the (file, line) of every import of it
+
+    Every file path is only stored once, the occurrences of a package are
+    stored as pairs of file and line numbers in an array, so the index stays
+    small for large source trees.
+    """
+
+    __slots__ = ("_files", "_file_ids", "_occurrences")
+
+    def __init__(self):
+        self._files: typing.List[str] = []
+        self._file_ids: typing.Dict[str, int] = {}
+        self._occurrences: typing.Dict[str, array.array] = {}
+
+    def __getitem__(self, name: str) -> typing.List[typing.Tuple[str, int]]:
+        occurrences = self._occurrences[name]
+        return sorted(
+            (self._files[occurrences[i]], occurrences[i + 1])
+            for i in range(0, len(occurrences), 2)
+        )
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(self._occurrences)
+
+    def __len__(self) -> int:
+        return len(self._occurrences)
+
+    def add(self, name: str, path: str, line: int):
+        """Record that the file at path imports name on line"""
+        file_id = self._file_ids.get(path)
+        if file_id is None:
+            file_id = self._file_ids[path] = len(self._files)
+            self._files.append(path)
+        occurrences = self._occurrences.get(name)
+        if occurrences is None:
+            occurrences = self._occurrences[name] = array.array("I")
+        occurrences.append(file_id)
+        occurrences.append(line)
+
+    def discard(self, name: str):
+        """Remove name from the index, if it is present"""
+        self._occurrences.pop(name, None)
+
+    def rename(self, name: str, new_name: str):
+        """Record the imports of name as imports of new_name"""
+        occurrences = self._occurrences.pop(name, None)
+        if occurrences is not None:
+            self._occurrences.setdefault(new_name, array.array("I")).extend(occurrences)
+
+    def files(self, name: str) -> typing.Set[str]:
+        """The files that import name"""
+        occurrences = self._occurrences[name]
+        return {self._files[occurrences[i]] for i in range(0, len(occurrences), 2)}
+
+    def relative_to(self, root: str) -> "ImportIndex":
+        """A copy of the index, with file paths relative to root"""
+        index = ImportIndex()
+        index._files = [os.path.relpath(path, root) for path in self._files]
+        index._file_ids = {path: i for i, path in enumerate(index._files)}
+        index._occurrences = {
+            name: array.array("I", occurrences)
+            for name, occurrences in self._occurrences.items()
+        }
+        return index
+
+    def split(self, roots: typing.Iterable[str]) -> typing.Dict[str, "ImportIndex"]:
+        """Split the index by the directories in roots
+
+        Each file belongs to the deepest of roots it is in, files outside every
+        root are left out.
+        """
+        roots = set(roots)
+        indexes = {root: ImportIndex() for root in roots}
+        owners = [_owner(path, roots) for path in self._files]
+        for name, occurrences in self._occurrences.items():
+            for i in range(0, len(occurrences), 2):
+                owner = owners[occurrences[i]]
+                if owner is not None:
+                    path = self._files[occurrences[i]]
+                    indexes[owner].add(name, path, occurrences[i + 1])
+        return indexes
+
+
+def _owner(path: str, roots: typing.Set[str]) -> typing.Optional[str]:
+    """The deepest directory in roots that path is in"""
+    directory = os.path.dirname(path)
+    while directory not in roots:
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+    return directory
@@ -0,0 +1,225 @@
+"""Readers of the python code in source files
+
+A reader yields the number and text of each line of code in a file, the suffix
+of a file picks its reader from `READERS`. Plain source files are read as text,
+the parsers in `requtils.scan_file` only apply to them. Other formats (like
+notebooks) yield just the lines of code in them, numbered by their line in the
+file, and are matched a line at a time.
+"""
+import os
+import re
+import typing
+
+Reader = typing.Callable[[str], typing.Iterator[typing.Tuple[int, str]]]
+
+_WHITESPACE_RE = re.compile(rb"[ \t\r\n]*")
+# Characters that start or end a string or a container
+_STRUCTURE_RE = re.compile(rb'["\[\]{}]')
+# Numbers, true, false and null
+_SCALAR_RE = re.compile(rb"[^\s,\]}]*")
+
+
+def read_text(path) -> typing.Iterator[typing.Tuple[int, str]]:
+    """Read a plain source file, a line at a time"""
+    with open(path) as f:
+        yield from enumerate(f, 1)
+
+
+def read_notebook(path) -> typing.Iterator[typing.Tuple[int, str]]:
+    """Read the lines of the code cells in a Jupyter notebook (nbformat 4)
+
+    The notebook is memory mapped and streamed through, only the keys and the
+    cell types and sources are decoded. Everything else, like the (often base64
+    encoded) outputs, is skipped without being copied. Reading stops at the
+    first error in a notebook that isn't valid JSON.
+    """
+    import mmap
+
+    with open(path, "rb") as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Empty files (and some special files) can't be mapped
+            buffer = f.read()
+        try:
+            yield from _NotebookScanner(buffer).code_lines()
+        except ValueError:
+            return
+        finally:
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+
+
+READERS: typing.Dict[str, Reader] = {
+    ".py": read_text,
+    ".pyi": read_text,
+    ".pyx": read_text,
+    ".ipynb": read_notebook,
+}
+
+
+def register_reader(suffix: str, reader: Reader):
+    """Scan files with suffix (e.g. `.pyw`) for imports, reading them with reader
+
+    With several jobs, readers must be registered when `_realreq.requtils` is
+    imported, so worker processes have them too.
+    """
+    READERS[suffix.lower()] = reader
+
+
+def get_reader(path: str) -> typing.Optional[Reader]:
+    """The reader of the file at path, None if it isn't a source file"""
+    return READERS.get(os.path.splitext(path)[1].lower())
+
+
+class _NotebookScanner:
+    """Scans the JSON of a notebook in a buffer, without decoding all of it
+
+    Only the structure needed to find the code cells is followed, other values
+    are skipped by searching for the characters that delimit them.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self._position = 0
+        # Newlines are only counted when a line number is needed
+        self._line = 1
+        self._counted = 0
+
+    def code_lines(self) -> typing.Iterator[typing.Tuple[int, str]]:
+        for key in self._members():
+            if key == "cells":
+                for _ in self._elements():
+                    yield from self._code_cell()
+            else:
+                self._skip_value()
+
+    def _code_cell(self) -> typing.List[typing.Tuple[int, str]]:
+        cell_type = None
+        source: typing.List[typing.Tuple[int, str]] = []
+        for key in self._members():
+            if key == "cell_type":
+                cell_type = self._read_string()
+            elif key == "source":
+                source = self._read_source()
+            else:
+                self._skip_value()
+        return source if cell_type == "code" else []
+
+    def _read_source(self) -> typing.List[typing.Tuple[int, str]]:
+        """Read a source, a string or a list of strings (usually one per line)"""
+        if self._peek() != b"[":
+            line = self._line_at(self._position)
+            return [(line, text) for text in self._read_string().splitlines()]
+        lines = []
+        for _ in self._elements():
+            line = self._line_at(self._position)
+            lines.extend((line, text) for text in self._read_string().splitlines())
+        return lines
+
+    def _members(self) -> typing.Iterator[str]:
+        """Yield each key of an object, the value must be read before the next"""
+        self._expect(b"{")
+        if self._peek() == b"}":
+            self._position += 1
+            return
+        while True:
+            key = self._read_string()
+            self._expect(b":")
+            self._skip_whitespace()
+            yield key
+            if not self._next_item(b"}"):
+                return
+
+    def _elements(self) -> typing.Iterator[None]:
+        """Yield before each element of an array, which must be read before the next"""
+        self._expect(b"[")
+        if self._peek() == b"]":
+            self._position += 1
+            return
+        while True:
+            yield
+            if not self._next_item(b"]"):
+                return
+
+    def _next_item(self, close: bytes) -> bool:
+        self._skip_whitespace()
+        char = self._buffer[self._position : self._position + 1]
+        self._position += 1
+        if char == b",":
+            self._skip_whitespace()
+            return True
+        if char != close:
+            raise ValueError(f"Expected , or {close!r} at {self._position - 1}")
+        return False
+
+    def _read_string(self) -> str:
+        import json
+
+        self._skip_whitespace()
+        start = self._position
+        if self._peek() != b'"':
+            raise ValueError(f"Expected a string at {start}")
+        self._position = self._string_end(start)
+        return json.loads(self._buffer[start : self._position])
+
+    def _skip_value(self):
+        self._skip_whitespace()
+        char = self._peek()
+        if char == b'"':
+            self._position = self._string_end(self._position)
+            return
+        if char not in (b"{", b"["):
+            self._position = _SCALAR_RE.match(self._buffer, self._position).end()
+            return
+        depth = 0
+        while True:
+            match = _STRUCTURE_RE.search(self._buffer, self._position)
+            if match is None:
+                raise ValueError("Unexpected end of the notebook")
+            char = match.group()
+            if char == b'"':
+                self._position = self._string_end(match.start())
+                continue
+            self._position = match.end()
+            depth += 1 if char in (b"{", b"[") else -1
+            if not depth:
+                return
+
+    def _string_end(self, start: int) -> int:
+        """The position after the string that starts at start"""
+        buffer = self._buffer
+        end = start + 1
+        while True:
+            end = buffer.find(b'"', end)
+            if end < 0:
+                raise ValueError(f"Unterminated string at {start}")
+            # A quote is escaped by an odd number of backslashes
+            backslashes = 0
+            while buffer[end - 1 - backslashes] == 0x5C:
+                backslashes += 1
+            end += 1
+            if not backslashes % 2:
+                return end
+
+    def _line_at(self, position: int) -> int:
+        buffer = self._buffer
+        newline = buffer.find(b"\n", self._counted, position)
+        while newline >= 0:
+            self._line += 1
+            newline = buffer.find(b"\n", newline + 1, position)
+        self._counted = position
+        return self._line
+
+    def _expect(self, char: bytes):
+        self._skip_whitespace()
+        if self._peek() != char:
+            raise ValueError(f"Expected {char!r} at {self._position}")
+        self._position += 1
+        self._skip_whitespace()
+
+    def _peek(self) -> bytes:
+        return self._buffer[self._position : self._position + 1]
+
+    def _skip_whitespace(self):
+        self._position = _WHITESPACE_RE.match(self._buffer, self._position).end()
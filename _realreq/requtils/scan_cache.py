@@ -0,0 +1,224 @@
+"""Persistent cache of the imports found in source files
+
+Entries are keyed by the path of the file, and are only used while the files
+modification time and size (and optionally the hash of its content) match.
+"""
+import os
+import pathlib
+import typing
+
+from .provenance import Imports
+
+CACHE_DIR_NAME = ".realreq_cache"
+# Bump when the format of stored imports changes, to discard old entries
+SCHEMA_VERSION = "2"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    digest TEXT,
+    imports TEXT NOT NULL
+);
+"""
+
+
+class ScanCache:
+    """Cache of the imports found in each source file, stored in cache_dir
+
+    Without a cache_dir the cache is only kept in memory.
+
+    With hash_contents, files whose modification time or size changed are
+    hashed, and their entry is still used if the content is unchanged (e.g.
+    after a fresh checkout). Each parser has its own cache, as they don't find
+    the same imports.
+    """
+
+    def __init__(
+        self,
+        cache_dir: typing.Optional[pathlib.Path],
+        hash_contents: bool = False,
+        parser: str = "regex",
+    ):
+        import sqlite3
+
+        self.hash_contents = hash_contents
+        if cache_dir is None:
+            # Only kept in memory, for the lifetime of the cache object
+            self.cache_dir = None
+            database = ":memory:"
+        else:
+            self.cache_dir = pathlib.Path(cache_dir)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            ignore = self.cache_dir / ".gitignore"
+            if not ignore.exists():
+                ignore.write_text("# Created by realreq\n*\n")
+            database = str(self.cache_dir / f"scan-{parser}.sqlite3")
+        self._conn = sqlite3.connect(database, timeout=30)
+        self._conn.executescript(_SCHEMA)
+        self._check_schema()
+        self._entries: typing.Optional[typing.Dict[str, tuple]] = None
+        self._updates: typing.List[tuple] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, path: str, stat: os.stat_result) -> typing.Optional[Imports]:
+        """Get the cached imports of the file at path, if they are still valid"""
+        row = self._get_entries().get(path)
+        if row is None:
+            return None
+        mtime_ns, size, digest, imports = row
+        if (mtime_ns, size) != (stat.st_mtime_ns, stat.st_size):
+            if not (self.hash_contents and digest and digest == _hash_file(path)):
+                return None
+            # Content is unchanged, refresh the entry so it isn't hashed again
+            self._updates.append(
+                (path, stat.st_mtime_ns, stat.st_size, digest, imports)
+            )
+        return _split(imports)
+
+    def put(self, path: str, stat: os.stat_result, imports: Imports):
+        """Store the imports found in the file at path, with their line numbers"""
+        digest = _hash_file(path) if self.hash_contents else None
+        self._updates.append(
+            (path, stat.st_mtime_ns, stat.st_size, digest, _join(imports))
+        )
+
+    def index(self, root: str) -> typing.Dict[str, Imports]:
+        """Get the cached imports of every file under root, without validating them"""
+        return {
+            path: _split(row[-1])
+            for path, row in self._get_entries().items()
+            if _is_under(path, root)
+        }
+
+    def scanned_at(
+        self, root: str
+    ) -> typing.Optional[typing.Tuple[str, typing.Set[str]]]:
+        """The git commit the last full scan of root was made at
+
+        Returned with the files whose cached imports may not match that commit,
+        like changes that weren't committed yet. None if no commit is recorded.
+        """
+        import json
+
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = ?", ("commit " + root,)
+        ).fetchone()
+        if row is None:
+            return None
+        record = json.loads(row[0])
+        return record["commit"], set(record["changed"])
+
+    def set_scanned_at(
+        self, root: str, commit: typing.Optional[str], changed: typing.Iterable[str]
+    ):
+        """Record the commit root was scanned at, and the files that differ from it
+
+        With no commit, the record is removed.
+        """
+        import json
+
+        key = "commit " + root
+        with self._conn:
+            if commit is None:
+                self._conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+                return
+            record = json.dumps({"commit": commit, "changed": sorted(changed)})
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, record)
+            )
+
+    def remove(self, paths: typing.Iterable[str]):
+        """Remove the entries for paths"""
+        stale = [(path,) for path in paths if self._get_entries().pop(path, None)]
+        with self._conn:
+            self._conn.executemany("DELETE FROM files WHERE path = ?", stale)
+
+    def prune(self, root: str, seen: typing.Collection[str]):
+        """Remove entries for files under root that were not seen in the last scan"""
+        self.remove(
+            [
+                path
+                for path in self._get_entries()
+                if _is_under(path, root) and path not in seen
+            ]
+        )
+
+    def flush(self):
+        """Write pending entries to disk"""
+        if not self._updates:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", self._updates
+            )
+        self._updates = []
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    def _get_entries(self) -> typing.Dict[str, tuple]:
+        # Load every entry with one query, rather than a query per file
+        if self._entries is None:
+            self._entries = {
+                row[0]: row[1:]
+                for row in self._conn.execute(
+                    "SELECT path, mtime_ns, size, digest, imports FROM files"
+                )
+            }
+        return self._entries
+
+    def _check_schema(self):
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = 'schema'"
+        ).fetchone()
+        if row is not None and row[0] == SCHEMA_VERSION:
+            return
+        with self._conn:
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (SCHEMA_VERSION,)
+            )
+
+
+def default_cache_dir(source: pathlib.Path) -> pathlib.Path:
+    """The cache directory used for source when none is given"""
+    source = pathlib.Path(source)
+    root = source.parent if source.is_file() else source
+    return root / CACHE_DIR_NAME
+
+
+def _is_under(path: str, root: str) -> bool:
+    return path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def _join(imports: Imports) -> str:
+    return "\n".join(f"{module} {line}" for module, line in imports)
+
+
+def _split(imports: str) -> Imports:
+    if not imports:
+        return []
+    split = []
+    for item in imports.split("\n"):
+        module, _, line = item.rpartition(" ")
+        split.append((module, int(line)))
+    return split
+
+
+def _hash_file(path: str) -> str:
+    import hashlib
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fi:
+        for chunk in iter(lambda: fi.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
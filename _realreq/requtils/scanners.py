@@ -0,0 +1,82 @@
+"""Alternative scanners for the imports in a source file
+
+The default scanner in `requtils.scan_file` matches `IMPORT_RE` against each
+line, the scanners here trade some speed for accuracy.
+"""
+import re
+import typing
+
+from .provenance import Imports
+
+# Byte equivalent of `requtils.IMPORT_RE`, anchored to the start of each line
+_IMPORT_BYTES_RE = re.compile(
+    rb"^(?:from (?P<from>[a-zA-Z0-9._]+)|import (?P<import>[a-zA-Z0-9+._]+))",
+    re.MULTILINE,
+)
+
+
+def scan_ast(path) -> typing.Optional[Imports]:
+    """Scans the file at path by parsing it, returning the modules it imports
+
+    This finds every import statement, including ones inside functions, `try`
+    blocks, or split across lines, and ignores text that only looks like an
+    import (e.g. in docstrings). Relative imports are returned with their
+    leading `.`. Each module is paired with the line of the import statement.
+    Returns None if the file isn't valid python.
+    """
+    import ast
+
+    with open(path, "rb") as f:
+        source = f.read()
+    # Parsing is expensive, so skip files that can't contain an import
+    if b"import" not in source:
+        return []
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+
+    imports = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.extend((alias.name, node.lineno) for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            imports.append(("." * node.level + (node.module or ""), node.lineno))
+    # ast.walk is breadth first, put nested imports back in file order
+    imports.sort(key=lambda item: item[1])
+    return imports
+
+
+def scan_mmap(path) -> Imports:
+    """Scans the raw bytes of the file at path, returning the modules it imports
+
+    Finds the same imports as the regex parser, but the file is memory mapped
+    and searched in one pass, without being split into lines or decoded.
+    """
+    import mmap
+
+    with open(path, "rb") as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Empty files (and some special files) can't be mapped
+            return _scan_bytes(f.read())
+        try:
+            return _scan_bytes(buffer)
+        finally:
+            buffer.close()
+
+
+def _scan_bytes(buffer) -> Imports:
+    imports = []
+    # Line numbers are counted from the previous match, so the file is only
+    # counted through once
+    line = 1
+    position = 0
+    for match in _IMPORT_BYTES_RE.finditer(buffer):
+        start = match.start()
+        line += buffer[position:start].count(b"\n")
+        position = start
+        module = match.group("from") or match.group("import")
+        imports.append((module.decode("ascii"), line))
+    return imports
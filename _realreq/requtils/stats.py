@@ -0,0 +1,143 @@
+"""Timings and counters of the work done during a run"""
+import contextlib
+import time
+import typing
+
+
+class Stats:
+    """Records the wall time of each phase of a run, and counters of the work done
+
+    Phases can be nested, a nested phase is named after the phases it is in
+    (e.g. `resolve/pip show`), and its time is included in theirs. Entering a
+    phase again adds to its time.
+
+    Stats can be shared by threads, each thread nests its own phases, and the
+    time of phases that run at once in several threads is added up. Work handed
+    to another thread can be nested in the phases it was handed over in with
+    `bind`.
+    """
+
+    def __init__(self):
+        import threading
+
+        self.phases: typing.Dict[str, float] = {}
+        self.counters: typing.Dict[str, int] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Time the body of the with statement as the phase name"""
+        stack = self._stack()
+        stack.append(name)
+        key = "/".join(stack)
+        with self._lock:
+            # Insert now, so phases are reported in the order they started
+            self.phases.setdefault(key, 0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.phases[key] += elapsed
+            stack.pop()
+
+    def add_time(self, name: str, seconds: float):
+        """Add seconds to the phase name, nested in the phases the thread is in
+
+        For work that a with statement can't wrap, like the steps of a
+        generator, or work done by another process.
+        """
+        key = "/".join(self._stack() + [name])
+        with self._lock:
+            self.phases[key] = self.phases.get(key, 0.0) + seconds
+
+    def bind(self, fn: typing.Callable) -> typing.Callable:
+        """Wrap fn to run in the phases the calling thread is in now
+
+        For work submitted to a pool, so its phases are nested in the phase it
+        was submitted in (e.g. `resolve/pip show`) rather than at the top.
+        """
+        stack = list(self._stack())
+
+        def bound(*args, **kwargs):
+            outer = self._stack()
+            self._local.stack = list(stack)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._local.stack = outer
+
+        return bound
+
+    def count(self, name: str, amount: int = 1):
+        """Add amount to the counter name"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def update(self, counters: typing.Mapping[str, int]):
+        """Add each of counters, e.g. the counters of a worker process"""
+        for name, amount in counters.items():
+            self.count(name, amount)
+
+    def as_dict(self) -> typing.Dict[str, typing.Dict]:
+        return {"phases": dict(self.phases), "counters": dict(self.counters)}
+
+    def to_json(self) -> str:
+        import json
+
+        return json.dumps(self.as_dict(), indent=2)
+
+    def report(self) -> str:
+        """A human readable report, nested phases are indented"""
+        lines = ["{0:<32} {1:>12}".format("Phase", "Seconds")]
+        for key, seconds in self.phases.items():
+            depth = key.count("/")
+            name = "  " * depth + key.rsplit("/", 1)[-1]
+            lines.append("{0:<32} {1:>12.4f}".format(name, seconds))
+        lines.append("{0:<32} {1:>12}".format("Counter", "Value"))
+        for name, value in self.counters.items():
+            lines.append("{0:<32} {1:>12}".format(name, value))
+        return "\n".join(lines) + "\n"
+
+    def _stack(self) -> typing.List[str]:
+        """The phases the current thread is in"""
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+
+@contextlib.contextmanager
+def phase(stats: typing.Optional[Stats], name: str):
+    """Time a phase in stats, or do nothing when stats is None"""
+    if stats is None:
+        yield
+    else:
+        with stats.phase(name):
+            yield
+
+
+def timed(
+    iterable: typing.Iterable, stats: typing.Optional[Stats], name: str
+) -> typing.Iterator:
+    """Iterate over iterable, timing the steps of the iteration as the phase name
+
+    Only the time spent producing each item is counted, not the time spent on
+    it by the consumer.
+    """
+    if stats is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            stats.add_time(name, time.perf_counter() - start)
+        yield item
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""Benchmarks for scanning source and resolving dependencies
+
+Builds a synthetic source tree and a synthetic environment of `*.dist-info`
+directories, times the main stages of realreq against them, and writes the
+results as JSON. Results from another run (e.g. of the previous version) can be
+compared against, to catch regressions:
+
+    PYTHONPATH=. python benchmarks/run.py --output before.json
+    PYTHONPATH=. python benchmarks/run.py --compare before.json
+"""
+import argparse
+import io
+import json
+import os
+import pathlib
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import typing
+
+import _realreq.realreq as realreq
+import _realreq.requtils as requtils
+import _realreq.display as display
+from _realreq.requtils import metadata
+
+STD_MODULES = ["os", "sys", "json", "typing", "collections", "re"]
+
+
+def make_source_tree(
+    root: pathlib.Path,
+    files: int,
+    lines: int,
+    import_density: float,
+    packages: int,
+    seed: int = 0,
+):
+    """Write files python files under root, spread over nested directories
+
+    import_density is the fraction of lines that are import statements, they
+    import the synthetic packages, the standard library, and relative modules.
+    """
+    rng = random.Random(seed)
+    for i in range(files):
+        directory = root.joinpath(*["pkg{0}".format(d) for d in range(i % 4)])
+        directory.mkdir(parents=True, exist_ok=True)
+        content = []
+        for _ in range(lines):
+            if rng.random() >= import_density:
+                content.append("value = compute(value, {0})\n".format(rng.random()))
+                continue
+            kind = rng.random()
+            if kind < 0.6:
+                content.append("import pkg_{0}\n".format(rng.randrange(packages)))
+            elif kind < 0.8:
+                content.append(
+                    "from pkg_{0}.sub import name\n".format(rng.randrange(packages))
+                )
+            elif kind < 0.9:
+                content.append("import {0}\n".format(rng.choice(STD_MODULES)))
+            else:
+                content.append("from . import sibling\n")
+        (directory / "module{0}.py".format(i)).write_text("".join(content))
+
+
+def make_environment(root: pathlib.Path, packages: int, fanout: int, seed: int = 0):
+    """Write a dist-info directory for each synthetic package under root
+
+    Each package depends on up to fanout packages with a higher number, so the
+    dependency graph is acyclic, with shared dependencies.
+    """
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    for i in range(packages):
+        dist_info = root / "pkg_{0}-1.0.{0}.dist-info".format(i)
+        dist_info.mkdir()
+        later = range(i + 1, packages)
+        deps = rng.sample(later, min(fanout, len(later)))
+        headers = ["Metadata-Version: 2.1", "Name: pkg_{0}".format(i)]
+        headers.append("Version: 1.0.{0}".format(i))
+        headers.extend("Requires-Dist: pkg_{0} (>=1.0)".format(d) for d in deps)
+        (dist_info / "METADATA").write_text("\n".join(headers) + "\n\nDescription\n")
+
+
+def timeit(func: typing.Callable[[], typing.Any], repeat: int) -> typing.Dict:
+    """Run func repeat times, returning statistics of the times in seconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "max": max(times),
+        "runs": repeat,
+    }
+
+
+def run_benchmarks(args, workdir: pathlib.Path) -> typing.Dict[str, typing.Dict]:
+    source = workdir / "src"
+    site = workdir / "site-packages"
+    make_source_tree(source, args.files, args.lines, args.import_density, args.packages)
+    make_environment(site, args.packages, args.fanout)
+
+    with open(next(source.glob("*.py"))) as fi:
+        lines = fi.readlines()
+    pkgs = realreq.search_source(source)
+    tree = requtils.build_dep_tree(pkgs, metadata.DistributionIndex([str(site)]))
+    compact = tree.compact()
+    index = metadata.DistributionIndex([str(site)])
+    index.versions(tree.nodes())
+
+    def scan_lines():
+        for line in lines:
+            requtils.scan_for_imports(line)
+
+    def build():
+        requtils.build_dep_tree(pkgs, metadata.DistributionIndex([str(site)]))
+
+    def tree_display():
+        display.TreeDisplay.display(compact, index, io.StringIO())
+
+    benchmarks = {
+        "scan_for_imports": scan_lines,
+        "build_dep_tree": build,
+        # Before the graphs are inverted an odd number of times
+        "TreeDisplay": tree_display,
+        "DependencyGraph.invert": tree.invert,
+        "CompactDependencyGraph.invert": compact.invert,
+    }
+    for parser in args.parsers:
+        benchmarks["search_source[{0}]".format(parser)] = lambda p=parser: (
+            realreq.search_source(source, parser=p)
+        )
+    return {
+        name: timeit(func, args.repeat)
+        for name, func in benchmarks.items()
+        if args.only is None or name in args.only
+    }
+
+
+def compare(
+    results: typing.Dict, baseline: typing.Dict, threshold: float
+) -> typing.List[str]:
+    """Report every benchmark in results, returning the names of regressions
+
+    A benchmark regressed when its minimum time grew by more than threshold
+    (a fraction) over the baseline.
+    """
+    regressions = []
+    for name, stats in sorted(results.items()):
+        if name not in baseline:
+            print("{0:32} {1:10.6f}s (new)".format(name, stats["min"]))
+            continue
+        ratio = stats["min"] / baseline[name]["min"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print("{0:32} {1:10.6f}s {2:6.2f}x{3}".format(name, stats["min"], ratio, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=500, help="Source files.")
+    parser.add_argument("--lines", type=int, default=200, help="Lines per file.")
+    parser.add_argument(
+        "--import-density",
+        type=float,
+        default=0.1,
+        help="Fraction of lines that are import statements.",
+    )
+    parser.add_argument(
+        "--packages", type=int, default=300, help="Packages in the environment."
+    )
+    parser.add_argument(
+        "--fanout", type=int, default=4, help="Dependencies of each package."
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Times each benchmark is run."
+    )
+    parser.add_argument(
+        "--parsers",
+        nargs="+",
+        default=list(requtils.PARSERS),
+        choices=requtils.PARSERS,
+        help="Parsers to time search_source with.",
+    )
+    parser.add_argument(
+        "--only", nargs="+", metavar="NAME", help="Only run the named benchmarks."
+    )
+    parser.add_argument(
+        "--output", type=pathlib.Path, help="Write the results to this JSON file."
+    )
+    parser.add_argument(
+        "--compare",
+        type=pathlib.Path,
+        metavar="RESULTS",
+        help="Compare against the results of a previous run, exiting with status 1 on a regression.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Slowdown (as a fraction) counted as a regression (Defaults to 0.2).",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_benchmarks(args, pathlib.Path(workdir))
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parameters": {
+            name: getattr(args, name)
+            for name in ("files", "lines", "import_density", "packages", "fanout")
+        },
+        "results": results,
+    }
+    if args.output:
+        with args.output.open("w") as fo:
+            json.dump(report, fo, indent=2)
+    if args.compare:
+        with args.compare.open() as fi:
+            baseline = json.load(fi)
+        if baseline["parameters"] != report["parameters"]:
+            sys.stderr.write("WARNING: Comparing runs with different parameters\n")
+        if compare(results, baseline["results"], args.threshold):
+            sys.exit(1)
+    elif not args.output:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import pathlib
+
+import pytest
+
+import graph_data
+
+HERE = pathlib.Path(__file__).parent.parent
+GRAPH_PATH = HERE / "dependency_graphs/default.graph"
+GRAPH = graph_data.GraphTestData(GRAPH_PATH)
+
+
+@pytest.fixture
+def site_packages(tmp_path):
+    """
+    Creates a site-packages directory with a dist-info for every package in the
+    default dependency graph
+
+    Returns: path to the site-packages directory
+    """
+    site = tmp_path / "site-packages"
+    site.mkdir()
+    versions = GRAPH.dep_versions()
+    for pkg, deps in GRAPH.dep_list().items():
+        write_dist_info(site, pkg, versions[pkg], deps)
+    return site
+
+
+def write_dist_info(site: pathlib.Path, name, version, deps):
+    dist_info = site / "{0}-{1}.dist-info".format(name.replace("-", "_"), "0.0")
+    dist_info.mkdir()
+    lines = ["Metadata-Version: 2.1", "Name: " + name, "Version: " + version]
+    lines.extend("Requires-Dist: " + dep for dep in deps)
+    # Requirements that don't apply to the environment should be ignored
+    lines.append('Requires-Dist: notused ; extra == "test"')
+    lines.extend(["", "Name: not-a-header", ""])
+    (dist_info / "METADATA").write_text("\n".join(lines))
+    return dist_info
+
+
+@pytest.fixture
+def mixed_case_site(tmp_path):
+    """
+    Creates a site-packages directory whose packages spell their names in
+    mixed case, and their requirements in lower case
+
+    Returns: path to the site-packages directory
+    """
+    site = tmp_path / "mixed-site-packages"
+    site.mkdir()
+    write_dist_info(site, "Flask", "2.0.0", ["jinja2", "markupsafe"])
+    write_dist_info(site, "Jinja2", "3.0.0", ["markupsafe"])
+    write_dist_info(site, "MarkupSafe", "2.1.0", [])
+    return site
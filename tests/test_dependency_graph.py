@@ -29,3 +29,131 @@ class TestDependencyGraph:
         g = graph.DependencyGraph()
         with pytest.raises(KeyError):
             g.get_dependants("no")
+
+
+@pytest.fixture(params=["graph", "compact"])
+def cyclic_graph(request):
+    """
+    app -> web -> http -> tls
+    app -> db -> tls
+    http <-> retry, and tls depends on itself
+    """
+    g = graph.DependencyGraph()
+    for dep, dependant in [
+        ("web", "app"),
+        ("db", "app"),
+        ("http", "web"),
+        ("tls", "http"),
+        ("tls", "db"),
+        ("retry", "http"),
+        ("http", "retry"),
+        ("tls", "tls"),
+    ]:
+        g.add_dependency(dep, dependant)
+    return g.compact() if request.param == "compact" else g
+
+
+class TestGraphAlgorithms:
+    def test_topological_order(self):
+        g = graph.DependencyGraph()
+        g.add_dependency("b", "a")
+        g.add_dependency("c", "b")
+        g.add_dependency("c", "a")
+        assert g.topological_order() == ["c", "b", "a"]
+
+    def test_topological_order_with_cycles(self, cyclic_graph):
+        order = cyclic_graph.topological_order()
+        assert sorted(order) == sorted(cyclic_graph.nodes())
+        assert order.index("tls") < order.index("db") < order.index("app")
+        assert order.index("http") < order.index("web") < order.index("app")
+
+    def test_strongly_connected_components(self, cyclic_graph):
+        components = cyclic_graph.strongly_connected_components()
+        assert sorted(components) == [
+            ["app"],
+            ["db"],
+            ["http", "retry"],
+            ["tls"],
+            ["web"],
+        ]
+        # Dependencies come before their dependants
+        assert components.index(["tls"]) < components.index(["http", "retry"])
+        assert components.index(["http", "retry"]) < components.index(["web"])
+
+    def test_cycles(self, cyclic_graph):
+        assert sorted(cyclic_graph.cycles()) == [["http", "retry"], ["tls"]]
+
+    def test_transitive_dependencies(self, cyclic_graph):
+        assert cyclic_graph.transitive_dependencies("app") == {
+            "web",
+            "db",
+            "http",
+            "retry",
+            "tls",
+        }
+        assert cyclic_graph.transitive_dependencies("http") == {"http", "retry", "tls"}
+        assert cyclic_graph.transitive_dependencies("db") == {"tls"}
+
+    def test_transitive_dependencies_follow_invert(self, cyclic_graph):
+        cyclic_graph.transitive_dependencies("app")
+        cyclic_graph.invert()
+        assert cyclic_graph.transitive_dependencies("db") == {"app"}
+
+    def test_subgraph(self, cyclic_graph):
+        sub = cyclic_graph.subgraph(["db", "http", "missing"])
+        assert sorted(sub.nodes()) == ["db", "http", "retry", "tls"]
+        assert sub.get_dependencies("db") == {"tls"}
+        assert sub.get_dependants("tls") == {"db", "http", "tls"}
+        assert "app" not in sub.nodes()
+
+    def test_why(self, cyclic_graph):
+        assert cyclic_graph.why("tls", ["app"]) == ["app", "db", "tls"]
+        assert cyclic_graph.why("tls", ["web"]) == ["web", "http", "tls"]
+        assert cyclic_graph.why("app", ["db"]) is None
+
+    def test_why_normalizes_names(self):
+        g = graph.DependencyGraph()
+        g.add_dependency("Jinja2", "Flask")
+        assert g.find("jinja2") == "Jinja2"
+        assert g.find("missing") is None
+        assert g.why("JINJA2", ["flask"]) == ["Flask", "Jinja2"]
+        with pytest.raises(KeyError):
+            g.why("missing", ["flask"])
+
+
+class TestCompactDependencyGraph:
+    @staticmethod
+    def make_graph() -> graph.CompactDependencyGraph:
+        g = graph.DependencyGraph()
+        g.add_dependency("foo", "bar")
+        g.add_dependency("baz", "bar")
+        g.add_dependency("baz", "foo")
+        g.add_node("spam")
+        return g.compact()
+
+    def test_matches_graph(self):
+        g = self.make_graph()
+        assert sorted(g.nodes()) == ["bar", "baz", "foo", "spam"]
+        assert g.get_dependencies("bar") == {"foo", "baz"}
+        assert g.get_dependants("baz") == {"bar", "foo"}
+        assert g.get_dependencies("spam") == set()
+
+    def test_neighbours_are_set_views(self):
+        deps = self.make_graph().get_dependencies("bar")
+        assert len(deps) == 2 and sorted(deps) == ["baz", "foo"]
+        assert "foo" in deps and "spam" not in deps and "missing" not in deps
+        assert deps & {"foo", "spam"} == {"foo"}
+        assert isinstance(deps | {"spam"}, frozenset)
+
+    def test_invert(self):
+        g = self.make_graph().invert()
+        assert g.get_dependencies("baz") == {"bar", "foo"}
+        assert g.get_dependants("bar") == {"foo", "baz"}
+
+    def test_get_nonexistent_dependency(self):
+        with pytest.raises(KeyError):
+            self.make_graph().get_dependencies("no")
+
+    def test_get_nonexistent_dependant(self):
+        with pytest.raises(KeyError):
+            self.make_graph().get_dependants("no")
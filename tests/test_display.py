@@ -0,0 +1,126 @@
+"""Tests for displaying dependency trees"""
+import io
+
+import _realreq.display as display
+import _realreq.requtils.dependency_tree as graph
+
+
+def make_graph(edges):
+    g = graph.DependencyGraph()
+    for dep, dependant in edges:
+        g.add_dependency(dep, dependant)
+    return g
+
+
+def test_shared_subtrees_are_expanded_once():
+    g = make_graph([("b", "a"), ("c", "a"), ("d", "b"), ("d", "c"), ("e", "d")])
+    assert display.TreeDisplay.render(["a"], g) == [
+        "- a\n",
+        "  |- b\n",
+        "    |- d\n",
+        "      |- e\n",
+        "  |- c\n",
+        "    |- d (*)\n",
+    ]
+
+
+def test_cycles_are_marked():
+    g = make_graph([("b", "a"), ("c", "b"), ("b", "c")])
+    assert display.TreeDisplay.render(["a"], g) == [
+        "- a\n",
+        "  |- b\n",
+        "    |- c\n",
+        "      |- b (cycle)\n",
+    ]
+
+
+class VersionIndex:
+    def versions(self, pkgs):
+        return {p: f"{p}==1.0" for p in pkgs}
+
+
+def test_cycles_without_roots_are_shown():
+    g = make_graph([("cycb", "cyca"), ("cyca", "cycb"), ("y", "x"), ("x", "y")])
+    g.add_dependency("dep", "app")
+    out = io.StringIO()
+    display.TreeDisplay.display(g, VersionIndex(), out, imports=["Y"])
+    assert out.getvalue() == (
+        "- app\n"
+        "  |- dep\n"
+        "- y\n"
+        "  |- x\n"
+        "    |- y (cycle)\n"
+        "- cyca\n"
+        "  |- cycb\n"
+        "    |- cyca (cycle)\n"
+    )
+
+
+def test_max_depth():
+    g = make_graph([("b", "a"), ("c", "b"), ("d", "c")])
+    assert display.TreeDisplay.render(["a"], g, max_depth=1) == [
+        "- a\n",
+        "  |- b\n",
+    ]
+
+
+def test_deep_graphs_do_not_recurse():
+    g = make_graph([(str(i + 1), str(i)) for i in range(5000)])
+    assert len(display.TreeDisplay.render(["0"], g.compact())) == 5001
+
+
+class FakeIndex:
+    def versions(self, pkgs):
+        known = {"a": "A==1.0", "b": "b @ git+https://example.com/b.git"}
+        return {
+            known[p].split(" ")[0].split("=")[0]: known[p] for p in pkgs if p in known
+        }
+
+
+def test_package_records():
+    g = make_graph([("b", "a"), ("c", "a")])
+    records = list(
+        display.package_records(
+            g, FakeIndex(), sources={"a": [("y.py", 1), ("x.py", 4), ("x.py", 2)]}
+        )
+    )
+    assert records[0] == {
+        "name": "a",
+        "version": "1.0",
+        "requirement": "A==1.0",
+        "dependencies": ["b", "c"],
+        "dependants": [],
+        "sources": ["x.py", "y.py"],
+        "imports": [
+            {"file": "x.py", "line": 2},
+            {"file": "x.py", "line": 4},
+            {"file": "y.py", "line": 1},
+        ],
+    }
+    assert (records[1]["version"], records[1]["requirement"]) == (
+        None,
+        "b @ git+https://example.com/b.git",
+    )
+    assert records[2]["requirement"] is None
+
+
+def test_package_records_direct_dependencies():
+    g = make_graph([])
+    g.add_node("a")
+    g.add_node("z")
+    records = list(display.package_records(g, FakeIndex(), direct={"A": ["c", "b"]}))
+    assert [(r["dependencies"], r["dependants"]) for r in records] == [
+        (["b", "c"], None),
+        (None, None),
+    ]
+
+
+def test_buffered_writer_writes_in_blocks():
+    stream = io.StringIO()
+    with display.BufferedWriter(stream, buffer_size=10) as out:
+        out.write("12345")
+        assert stream.getvalue() == ""
+        out.write("67890")
+        assert stream.getvalue() == "1234567890"
+        out.write("end\n")
+    assert stream.getvalue() == "1234567890end\n"
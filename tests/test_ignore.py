@@ -0,0 +1,106 @@
+"""Tests for the ignore rules of the source walk"""
+import pytest
+
+import _realreq.requtils as requtils
+from _realreq.requtils.ignore import Ignore, Rules
+
+
+@pytest.mark.parametrize(
+    "pattern, path, is_dir, expected",
+    [
+        ("build/", "build", True, True),
+        ("build/", "src/build", True, True),
+        ("build/", "build", False, None),
+        ("*.pyi", "pkg/stubs.pyi", False, True),
+        ("*.pyi", "pkg/stubs.py", False, None),
+        ("/setup.py", "setup.py", False, True),
+        ("/setup.py", "pkg/setup.py", False, None),
+        ("docs/*.py", "docs/conf.py", False, True),
+        ("docs/*.py", "docs/api/conf.py", False, None),
+        ("docs/**/*.py", "docs/api/conf.py", False, True),
+        ("docs/**/*.py", "docs/conf.py", False, True),
+        ("**/fixtures", "a/b/fixtures", True, True),
+        ("vendor/**", "vendor/a/b.py", False, True),
+        ("test_[ab].py", "test_a.py", False, True),
+        ("test_[!ab].py", "test_a.py", False, None),
+        ("test_?.py", "test_c.py", False, True),
+        ("test_?.py", "a/test_c.py", False, True),
+        ("\\#notes.py", "#notes.py", False, True),
+        ("# comment", "# comment", False, None),
+        ("", "anything", False, None),
+    ],
+)
+def test_patterns(pattern, path, is_dir, expected):
+    assert Rules([pattern], "/root").match(path, is_dir) is expected
+
+
+def test_last_pattern_wins():
+    rules = Rules(["*.py", "!keep.py", "generated/"], "/root")
+    assert rules.match("drop.py", False) is True
+    assert rules.match("keep.py", False) is False
+    assert rules.match("readme.md", False) is None
+    assert rules.match("generated", True) is True
+
+
+def make_tree(root):
+    for path, content in {
+        "app/main.py": "import requests\n",
+        "app/generated/schema.py": "import grpc\n",
+        "app/generated/keep.py": "import protobuf\n",
+        "app/.gitignore": "generated/*\n!generated/keep.py\n",
+        "build/lib/main.py": "import requests\n",
+        ".venv/lib/site.py": "import setuptools\n",
+        "env/pyvenv.cfg": "home = /usr/bin\n",
+        "env/lib/site.py": "import pip\n",
+        "node_modules/pkg/gyp.py": "import gyp\n",
+        "docs/conf.py": "import sphinx\n",
+        ".gitignore": "*.log\n/docs/\n",
+    }.items():
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text(content)
+
+
+def walk(root, ignore=None):
+    return sorted(
+        path[len(str(root)) + 1 :]
+        for path in requtils.iter_source_files(root, ignore=ignore)
+    )
+
+
+def test_walk_prunes_ignored_directories(tmp_path):
+    make_tree(tmp_path)
+    assert walk(tmp_path, Ignore(tmp_path)) == ["app/generated/keep.py", "app/main.py"]
+    assert walk(tmp_path, Ignore(tmp_path, ["app/"], gitignore=False)) == [
+        "docs/conf.py"
+    ]
+    assert len(walk(tmp_path, Ignore(tmp_path, defaults=False, gitignore=False))) == 8
+
+
+def test_walk_never_enters_ignored_directories(tmp_path, mocker):
+    make_tree(tmp_path)
+    scandir = mocker.spy(requtils.os, "scandir")
+    walk(tmp_path, Ignore(tmp_path))
+    entered = {call.args[0][len(str(tmp_path)) :] for call in scandir.call_args_list}
+    assert entered == {"", "/app", "/app/generated", "/env"}
+
+
+def test_is_ignored_path(tmp_path):
+    make_tree(tmp_path)
+    ignore = Ignore(tmp_path, ["*.md"])
+    assert ignore.is_ignored_path(str(tmp_path / "docs" / "conf.py"))
+    assert ignore.is_ignored_path(str(tmp_path / "env" / "lib" / "site.py"))
+    assert ignore.is_ignored_path(str(tmp_path / "app" / "generated" / "schema.py"))
+    assert ignore.is_ignored_path(str(tmp_path / "README.md"))
+    assert not ignore.is_ignored_path(str(tmp_path / "app" / "generated" / "keep.py"))
+    assert not ignore.is_ignored_path(str(tmp_path.parent / "other.py"))
+
+
+def test_is_ignored_path_reads_each_directory_once(tmp_path, mocker):
+    make_tree(tmp_path)
+    from_file = mocker.spy(Rules, "from_file")
+    ignore = Ignore(tmp_path)
+    for i in range(100):
+        assert not ignore.is_ignored_path(str(tmp_path / "app" / f"{i}.py"))
+        assert ignore.is_ignored_path(str(tmp_path / "app" / "generated" / f"{i}.py"))
+    # The .gitignore of the root, and of app
+    assert from_file.call_count == 2
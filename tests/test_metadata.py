@@ -0,0 +1,177 @@
+"""Tests for reading metadata of installed distributions"""
+import graph_data
+from tests.fixtures.environment import (
+    GRAPH_PATH,
+    site_packages,
+    write_dist_info,
+)
+
+import _realreq.requtils as requtils
+import _realreq.requtils.metadata as metadata
+from _realreq.requtils import index_cache
+from _realreq.requtils.index_cache import CachedIndex
+
+
+def test_normalize_name():
+    assert metadata.normalize_name("Fake_Pkg.extra--Name") == "fake-pkg-extra-name"
+
+
+def test_index_reads_distribution(site_packages):
+    index = metadata.DistributionIndex([str(site_packages)])
+    dist = index.get("Requests")
+    assert dist.name == "requests"
+    assert dist.version == "0.2.0"
+    assert set(dist.deps) == {"baz", "spam"}
+
+
+def test_index_finds_normalized_names(site_packages):
+    index = metadata.DistributionIndex([str(site_packages)])
+    assert index.get("fake_pkg").name == "fake-pkg"
+
+
+def test_index_first_path_wins(site_packages, tmp_path):
+    first = tmp_path / "first"
+    first.mkdir()
+    write_dist_info(first, "foo", "2.0.0", [])
+    index = metadata.DistributionIndex([str(first), str(site_packages)])
+    assert index.get("foo").version == "2.0.0"
+
+
+def test_show_reports_missing(site_packages, capsys):
+    index = metadata.DistributionIndex([str(site_packages)])
+    found = index.show(["foo", "missing"])
+    assert [d.name for d in found] == ["foo"]
+    assert "missing" in capsys.readouterr().err
+
+
+def test_metadata_backend_matches_graph(site_packages, mocker):
+    mocker.patch("sys.path", [str(site_packages)])
+    pkgs = ["requests", "foo", "abbreviation", "fake-pkg"]
+    tree = requtils.build_dep_tree(pkgs, requtils.get_index("metadata"))
+    expected = graph_data.GraphTestData(GRAPH_PATH, subset=pkgs).dep_list()
+    assert set(tree.nodes()) == set(expected)
+    for pkg, deps in expected.items():
+        assert set(tree.get_dependencies(pkg)) == set(deps)
+
+
+def test_index_versions(site_packages):
+    index = metadata.DistributionIndex([str(site_packages)])
+    assert index.versions(["foo", "fake_pkg", "missing"]) == {
+        "foo": "foo==1.0.0",
+        "fake-pkg": "fake-pkg==0.0.1",
+    }
+
+
+def test_direct_url_requirements(tmp_path):
+    vcs = write_dist_info(tmp_path, "vcs-pkg", "1.0", [])
+    (vcs / "direct_url.json").write_text(
+        '{"url": "https://example.com/vcs.git",'
+        ' "vcs_info": {"vcs": "git", "commit_id": "abc123"}}'
+    )
+    editable = write_dist_info(tmp_path, "editable-pkg", "1.0", [])
+    (editable / "direct_url.json").write_text(
+        '{"url": "file:///src/editable", "dir_info": {"editable": true}}'
+    )
+    index = metadata.DistributionIndex([str(tmp_path)])
+    assert index.versions(["vcs-pkg", "editable-pkg"]) == {
+        "vcs-pkg": "vcs-pkg @ git+https://example.com/vcs.git@abc123",
+        "editable-pkg": "-e /src/editable",
+    }
+
+
+def test_fingerprint_changes_with_environment(site_packages):
+    before = metadata.environment_fingerprint([str(site_packages)])
+    assert before == metadata.environment_fingerprint([str(site_packages)])
+    write_dist_info(site_packages, "new-pkg", "1.0", [])
+    assert before != metadata.environment_fingerprint([str(site_packages)])
+
+
+def test_fingerprint_ignores_other_files(site_packages, tmp_path):
+    paths = [str(site_packages), str(tmp_path)]
+    before = metadata.environment_fingerprint(paths)
+    (tmp_path / "notes.txt").write_text("")
+    (site_packages / "module.py").write_text("")
+    assert before == metadata.environment_fingerprint(paths)
+
+
+def test_cached_index_reuses_answers(site_packages, tmp_path, mocker):
+    path = tmp_path / "metadata.json"
+    index = CachedIndex(metadata.DistributionIndex([str(site_packages)]), path, "fp")
+    first = requtils.build_dep_tree(["requests", "fake_pkg"], index)
+    versions = index.versions(first.nodes())
+    index.save()
+
+    read = mocker.patch.object(metadata, "read_distribution")
+    index = CachedIndex(metadata.DistributionIndex([str(site_packages)]), path, "fp")
+    second = requtils.build_dep_tree(["requests", "fake_pkg"], index)
+    assert dict(second) == dict(first)
+    assert index.versions(second.nodes()) == versions
+    assert read.call_count == 0
+
+
+def test_cached_index_counts_hits(site_packages, tmp_path):
+    stats = requtils.Stats()
+    path = tmp_path / "metadata.json"
+    index = CachedIndex(
+        metadata.DistributionIndex([str(site_packages)]), path, "fp", stats
+    )
+    index.show(["foo", "requests"])
+    index.show(["Foo", "bar"])
+    assert stats.counters["metadata_cache_hits"] == 1
+
+
+def test_cached_index_discards_other_environments(site_packages, tmp_path, mocker):
+    path = tmp_path / "metadata.json"
+    index = CachedIndex(metadata.DistributionIndex([str(site_packages)]), path, "fp")
+    index.show(["foo"])
+    index.save()
+
+    read = mocker.spy(metadata, "read_distribution")
+    index = CachedIndex(metadata.DistributionIndex([str(site_packages)]), path, "new")
+    assert [d.name for d in index.show(["foo"])] == ["foo"]
+    assert read.call_count == 1
+
+
+def test_packages_distributions(site_packages):
+    dist_info = write_dist_info(site_packages, "PyYAML", "6.0", [])
+    (dist_info / "top_level.txt").write_text("_yaml\nyaml\n")
+    # Without top_level.txt the names are inferred from the installed files
+    dist_info = write_dist_info(site_packages, "typing-extensions", "4.0", [])
+    (dist_info / "RECORD").write_text(
+        "typing_extensions.py,sha256=abc,100\n"
+        "__pycache__/typing_extensions.cpython-311.pyc,,\n"
+        "typing_extensions-4.0.dist-info/METADATA,sha256=abc,100\n"
+        "../../bin/script,sha256=abc,100\n"
+    )
+    dist_info = write_dist_info(site_packages, "attrs", "23.1", [])
+    (dist_info / "RECORD").write_text(
+        "attr/__init__.py,sha256=abc,100\nattrs/__init__.py,sha256=abc,100\n"
+    )
+
+    packages = metadata.packages_distributions([str(site_packages)])
+    assert packages["yaml"] == packages["_yaml"] == ["PyYAML"]
+    assert packages["typing_extensions"] == ["typing-extensions"]
+    assert packages["attr"] == packages["attrs"] == ["attrs"]
+    assert set(packages) == {"yaml", "_yaml", "typing_extensions", "attr", "attrs"}
+
+
+def test_import_aliases():
+    packages = {
+        "yaml": ["PyYAML"],
+        "typing_extensions": ["typing-extensions"],
+        # Names provided by several distributions are ambiguous
+        "google": ["protobuf", "google-auth"],
+    }
+    assert metadata.import_aliases(packages) == {"yaml": "PyYAML"}
+
+
+def test_cached_packages_distributions(tmp_path, mocker):
+    path = tmp_path / "modules.json"
+    read = mocker.patch.object(
+        metadata, "packages_distributions", return_value={"yaml": ["PyYAML"]}
+    )
+    assert index_cache.cached_packages_distributions(path, "fp") == {"yaml": ["PyYAML"]}
+    assert index_cache.cached_packages_distributions(path, "fp") == {"yaml": ["PyYAML"]}
+    assert read.call_count == 1
+    index_cache.cached_packages_distributions(path, "new")
+    assert read.call_count == 2
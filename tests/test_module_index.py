@@ -0,0 +1,86 @@
+"""Tests for the prebuilt index of standard library modules and aliases"""
+import sys
+import types
+
+import pytest
+
+import _realreq.realreq as realreq
+from _realreq import module_index
+
+
+@pytest.mark.parametrize(
+    "version, present, missing",
+    [
+        ((3, 6), ["fpectl", "asyncore", "os"], ["dataclasses", "zoneinfo"]),
+        ((3, 9), ["zoneinfo", "formatter"], ["dummy_threading", "tomllib"]),
+        ((3, 11), ["tomllib", "distutils"], ["binhex", "formatter"]),
+        ((3, 13), ["tomllib", "__main__"], ["distutils", "cgi", "telnetlib"]),
+    ],
+)
+def test_std_libs_of_each_version(version, present, missing):
+    std_libs = module_index.std_libs(version)
+    assert all(module in std_libs for module in present)
+    assert not any(module in std_libs for module in missing)
+
+
+def test_versions_outside_the_index_use_the_closest_version():
+    assert module_index.std_libs((2, 7)) == module_index.std_libs((3, 6))
+    assert module_index.std_libs((3, 40)) == module_index.std_libs((3, 13))
+
+
+@pytest.fixture
+def running(mocker):
+    """Run as the given python version, without `sys.stdlib_module_names`"""
+
+    def run_as(version):
+        mocker.patch.object(
+            module_index, "sys", types.SimpleNamespace(version_info=version)
+        )
+
+    module_index.std_libs.cache_clear()
+    yield run_as
+    module_index.std_libs.cache_clear()
+
+
+@pytest.mark.parametrize("version", [(3, 6), (3, 11), (3, 12), (3, 13), (3, 14)])
+def test_removed_std_libs_without_a_target_version(running, version):
+    running(version + (0,))
+    std_libs = module_index.std_libs()
+    for module in ["distutils", "imp", "asyncore", "cgi", "fpectl", "binhex", "os"]:
+        assert module in std_libs
+    assert "requests" not in std_libs
+
+
+@pytest.mark.parametrize(
+    "version, is_std_lib",
+    [((3, 8), True), ((3, 11), True), ((3, 12), False), ((3, 13), False)],
+)
+def test_removed_std_libs_of_target_version(running, version, is_std_lib):
+    running((3, 13, 0))
+    for module in ["distutils", "imp", "asyncore"]:
+        assert (module in module_index.std_libs(version)) is is_std_lib
+
+
+@pytest.mark.skipif(
+    not hasattr(sys, "stdlib_module_names"), reason="Added in python 3.10"
+)
+def test_running_version_includes_stdlib_module_names():
+    assert sys.stdlib_module_names <= module_index.std_libs()
+
+
+def test_find_imports_filters_std_libs_of_target_version(tmp_path):
+    (tmp_path / "main.py").write_text("import tomllib\nimport distutils\n")
+    assert set(realreq.find_imports(tmp_path, python_version=(3, 10))) == {"tomllib"}
+    assert set(realreq.find_imports(tmp_path, python_version=(3, 12))) == {"distutils"}
+
+
+def test_aliases_are_looked_up_by_normalized_name(tmp_path):
+    (tmp_path / "main.py").write_text("import Yaml\nimport PIL\nimport other\n")
+    aliases = {"yaml": "PyYAML", "PIL": "Pillow"}
+    aliases.update(("mod{0}".format(i), "pkg{0}".format(i)) for i in range(5000))
+    imports = realreq.find_imports(tmp_path, aliases=aliases)
+    assert set(imports) == {"PyYAML", "Pillow", "other"}
+
+
+def test_split_aliases_normalizes_import_names():
+    assert realreq.split_aliases(["Yaml=PyYAML\n"]) == {"yaml": "PyYAML"}
@@ -0,0 +1,126 @@
+"""Tests for the readers of source files"""
+import base64
+import json
+
+import pytest
+
+import _realreq.realreq as realreq
+import _realreq.requtils as requtils
+from _realreq.requtils import readers
+
+NOTEBOOK = {
+    "cells": [
+        {
+            "cell_type": "markdown",
+            "metadata": {},
+            "source": ["import markdown_only\n"],
+        },
+        {
+            "cell_type": "code",
+            "execution_count": 1,
+            "metadata": {"tags": ['quoted "tag" \\']},
+            "outputs": [
+                {
+                    "data": {
+                        "image/png": base64.b64encode(bytes(range(256)) * 64).decode(),
+                        "text/plain": ["import output_only\n"],
+                    },
+                    "metadata": {},
+                    "output_type": "display_data",
+                }
+            ],
+            "source": ["import numpy as np\n", "\n", "from pandas import DataFrame"],
+        },
+        {
+            "cell_type": "code",
+            "execution_count": None,
+            "metadata": {},
+            "outputs": [],
+            "source": "%matplotlib inline\nimport sklearn.linear_model",
+        },
+    ],
+    "metadata": {"kernelspec": {"name": "python3"}},
+    "nbformat": 4,
+    "nbformat_minor": 5,
+}
+
+
+@pytest.fixture
+def notebook(tmp_path):
+    path = tmp_path / "analysis.ipynb"
+    path.write_text(json.dumps(NOTEBOOK, indent=1))
+    return path
+
+
+def line_of(path, text: str) -> int:
+    lines = path.read_text().splitlines()
+    return next(i for i, line in enumerate(lines, 1) if text in line)
+
+
+def test_read_notebook(notebook):
+    numpy = line_of(notebook, "import numpy")
+    pandas = line_of(notebook, "from pandas")
+    sklearn = line_of(notebook, "import sklearn")
+    assert list(readers.read_notebook(notebook)) == [
+        (numpy, "import numpy as np"),
+        (numpy + 1, ""),
+        (pandas, "from pandas import DataFrame"),
+        (sklearn, "%matplotlib inline"),
+        (sklearn, "import sklearn.linear_model"),
+    ]
+
+
+def test_read_compact_notebook(tmp_path):
+    path = tmp_path / "compact.ipynb"
+    path.write_text(json.dumps(NOTEBOOK))
+    assert [text for _, text in readers.read_notebook(path) if text] == [
+        "import numpy as np",
+        "from pandas import DataFrame",
+        "%matplotlib inline",
+        "import sklearn.linear_model",
+    ]
+
+
+@pytest.mark.parametrize("content", ["", "{", '{"cells": [{"cell_type": "code", '])
+def test_read_invalid_notebook(tmp_path, content):
+    path = tmp_path / "broken.ipynb"
+    path.write_text(content)
+    assert list(readers.read_notebook(path)) == []
+
+
+@pytest.mark.parametrize("parser", requtils.PARSERS)
+def test_scan_notebook(notebook, parser):
+    assert [m for m, _ in requtils.scan_file(notebook, parser)] == [
+        "numpy",
+        "pandas",
+        "sklearn.linear_model",
+    ]
+
+
+def test_source_files():
+    for name in ["a.py", "b.PYI", "c.pyx", "d.ipynb"]:
+        assert requtils.is_source_file(name)
+    for name in ["e.txt", "f.json", "py"]:
+        assert not requtils.is_source_file(name)
+
+
+def test_register_reader(tmp_path, mocker):
+    mocker.patch.dict(readers.READERS)
+    path = tmp_path / "script.pyw"
+    path.write_text("import requests\n")
+    assert not requtils.is_source_file(path.name)
+    readers.register_reader(".PYW", readers.read_text)
+    assert requtils.scan_file(path) == [("requests", 1)]
+    assert list(requtils.iter_source_files(tmp_path)) == [str(path)]
+
+
+def test_search_source_reads_every_format(tmp_path, notebook):
+    (tmp_path / "stubs.pyi").write_text("import requests\n")
+    (tmp_path / "fast.pyx").write_text("import foo\ncimport cython\n")
+    assert realreq.search_source(tmp_path) == {
+        "numpy",
+        "pandas",
+        "sklearn",
+        "requests",
+        "foo",
+    }
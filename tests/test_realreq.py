@@ -1,10 +1,14 @@
 # Copyright 2020-2023 Tyler Calder
+import ast
 import collections
 import contextlib
 import io
+import json
 import unittest.mock
 import os
+import subprocess
 import sys
+import threading
 import typing
 import pathlib
 
@@ -20,10 +24,12 @@ from tests.fixtures.cli import (
     alias_file,
     source_files,
 )
+from tests.fixtures.environment import mixed_case_site, site_packages, write_dist_info
 
 
 import _realreq.realreq as realreq
 import _realreq.requtils as requtils
+from _realreq.requtils import metadata
 
 HERE = pathlib.Path(__file__).parent
 GRAPH_PATH = HERE / "dependency_graphs/default.graph"
@@ -43,11 +49,13 @@ _MOCK_DEPENDENCY_TREE_OUTPUT = """- abbreviation
     |- spam
       |- requests
 - wheel
-  |- spam
-    |- requests
+  |- spam (*)
 """
 
 
+REAL_RUN = subprocess.run
+
+
 def mock_pip_show(*args, **kwargs):
     pkgs = args[0][2:]
     pkg_output = []
@@ -73,13 +81,25 @@ def mock_pip_freeze(*args, **kwargs):
     return mock_result
 
 
+def mock_pip_version(*args, **kwargs):
+    mock_result = unittest.mock.MagicMock()
+    mock_result.configure_mock(
+        **{"stdout": b"pip 23.0 from /mock/site-packages/pip (python 3.11)\n"}
+    )
+    return mock_result
+
+
 def mock_subprocess_run(*args, **kwargs):
     """Mock calls to subprocess by routing them to the right mock"""
+    if args[0][0] == "git":
+        return REAL_RUN(*args, **kwargs)
     command = args[0][1]
     if command == "show":
         return mock_pip_show(*args, **kwargs)
     elif command == "freeze":
         return mock_pip_freeze(*args, **kwargs)
+    elif command == "--version":
+        return mock_pip_version(*args, **kwargs)
 
 
 def test_search_source_for_used_packages(source_files):
@@ -95,6 +115,313 @@ def test_search_source_for_used_packages(source_files):
     assert set(pkgs) == set(expected)
 
 
+def test_find_imports_maps_packages_to_lines(source_files):
+    """Each package is mapped to the file and line of its imports, after aliasing"""
+    imports = realreq.find_imports(source_files, aliases={"fake_pkg": "fake-pkg"})
+    main = str(
+        (source_files if source_files.is_file() else source_files / "main.py").resolve()
+    )
+    assert imports["fake-pkg"] == [(main, 9)]
+    assert imports["foo"] == [(main, 3), (main, 6)]
+    assert imports.files("foo") == {main}
+    assert "fake_pkg" not in imports
+
+
+@pytest.mark.parametrize("parser", requtils.PARSERS)
+def test_parsers_find_line_numbers(tmp_path, parser):
+    path = tmp_path / "main.py"
+    path.write_text(
+        "import requests\n\n\nfrom foo import bar\nimport requests.adapters\n"
+    )
+    assert requtils.scan_file(path, parser) == [
+        ("requests", 1),
+        ("foo", 4),
+        ("requests.adapters", 5),
+    ]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_scan_counters(source_files, jobs):
+    """Scan counters are the same when workers count them"""
+    stats = requtils.Stats()
+    realreq.find_imports(source_files, jobs=jobs, stats=stats)
+    main = source_files if source_files.is_file() else source_files / "main.py"
+    assert stats.counters == {
+        "files_scanned": 1,
+        "bytes_read": main.stat().st_size,
+        "imports_matched": 9,
+    }
+
+
+def test_import_defers_data_files_and_heavy_modules():
+    """Importing realreq doesn't build the std lib index or load modules only some runs need"""
+    code = (
+        "import sys, _realreq.realreq as realreq;"
+        "print(realreq.STD_LIBS._data);"
+        "print(sorted({'subprocess', 'concurrent.futures', 'sqlite3', 'json', 'ast'}"
+        " & set(sys.modules)))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        stdout=subprocess.PIPE,
+        check=True,
+        env={**os.environ, "PYTHONPATH": str(HERE.parent)},
+    )
+    assert result.stdout.decode().split("\n") == ["None", "[]", ""]
+
+
+def test_std_libs_include_removed_modules():
+    for module in ("os", "json", "distutils", "asyncore"):
+        assert module in realreq.STD_LIBS
+
+
+def test_parallel_search_matches_serial(source_files):
+    """Scanning with a pool of processes finds the same packages"""
+    for i in range(8):
+        (source_files.parent / "extra{0}.py".format(i)).write_text(
+            "import pkg{0}\nfrom foo.bar import baz\n".format(i)
+        )
+    serial = realreq.search_source(source_files.parent)
+    assert realreq.search_source(source_files.parent, jobs=3) == serial
+
+
+_AST_ONLY_SOURCE = '''"""Docstring mentioning
+from docstring import nothing
+"""
+import requests, spam
+from foo import (
+    bar,
+)
+
+
+def func():
+    import egg
+    from . import local_module
+
+
+try:
+    import wheel
+except ImportError:
+    pass
+'''
+
+
+def test_ast_parser_finds_every_import(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "main.py").write_text(_AST_ONLY_SOURCE)
+    assert realreq.search_source(src, parser="ast") == {
+        "requests",
+        "spam",
+        "foo",
+        "egg",
+        "wheel",
+    }
+
+
+def test_ast_parser_falls_back_on_invalid_source(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "main.py").write_text("import requests\nprint 'python 2'\n")
+    assert realreq.search_source(src, parser="ast") == {"requests"}
+
+
+def test_ast_parser_skips_files_without_imports(tmp_path, mocker):
+    path = tmp_path / "main.py"
+    path.write_text("x = 1\n")
+    parse = mocker.spy(ast, "parse")
+    assert requtils.scan_file(path, parser="ast") == []
+    assert parse.call_count == 0
+
+
+def test_mmap_parser_matches_regex_parser(source_files):
+    root = source_files.parent
+    (root / "empty.py").write_text("")
+    (root / "crlf.py").write_bytes(b"import spam\r\nfrom egg import x\r\n")
+    expected = realreq.search_source(root)
+    assert realreq.search_source(root, parser="mmap") == expected
+    assert {"spam", "egg", "requests"} <= expected
+
+
+def test_iter_source_files(tmp_path):
+    (tmp_path / "pkg" / "sub").mkdir(parents=True)
+    (tmp_path / "outside").mkdir()
+    (tmp_path / "pkg" / "a.py").write_text("")
+    (tmp_path / "pkg" / "sub" / "B.PY").write_text("")
+    (tmp_path / "pkg" / "notes.txt").write_text("")
+    (tmp_path / "outside" / "c.py").write_text("")
+    (tmp_path / "pkg" / "link").symlink_to(tmp_path / "outside")
+
+    found = set(requtils.iter_source_files(tmp_path / "pkg"))
+    assert found == {
+        str(tmp_path / "pkg" / "a.py"),
+        str(tmp_path / "pkg" / "sub" / "B.PY"),
+    }
+
+
+def test_iter_source_files_finds_projects(tmp_path):
+    (tmp_path / "svc" / "pkg").mkdir(parents=True)
+    (tmp_path / "lib").mkdir()
+    (tmp_path / "svc" / "pyproject.toml").write_text("")
+    (tmp_path / "svc" / "pkg" / "a.py").write_text("")
+    (tmp_path / "lib" / "setup.py").write_text("")
+
+    projects = []
+    found = set(requtils.iter_source_files(tmp_path, projects))
+    assert found == {
+        str(tmp_path / "svc" / "pkg" / "a.py"),
+        str(tmp_path / "lib" / "setup.py"),
+    }
+    assert sorted(projects) == [str(tmp_path / "lib"), str(tmp_path / "svc")]
+
+
+def test_import_index_split():
+    index = requtils.ImportIndex()
+    index.add("requests", "/repo/a/main.py", 1)
+    index.add("requests", "/repo/a/b/main.py", 2)
+    index.add("foo", "/repo/a/b/c/main.py", 3)
+    index.add("foo", "/repo/other.py", 4)
+    split = index.split(["/repo/a", "/repo/a/b", "/repo/empty"])
+    assert dict(split["/repo/a"]) == {"requests": [("/repo/a/main.py", 1)]}
+    assert dict(split["/repo/a/b"]) == {
+        "requests": [("/repo/a/b/main.py", 2)],
+        "foo": [("/repo/a/b/c/main.py", 3)],
+    }
+    assert not split["/repo/empty"]
+
+
+@pytest.mark.parametrize("jobs", [2, 0])
+def test_build_dep_tree_concurrent(mocker, jobs):
+    mock_run = mocker.patch("subprocess.run")
+    mock_run.side_effect = mock_pip_show
+    pkgs = ["requests", "foo", "abbreviation", "fake-pkg"]
+    expected = requtils.build_dep_tree(pkgs)
+    calls = mock_run.call_count
+
+    stats = requtils.Stats()
+    with stats.phase("resolve"):
+        actual = requtils.build_dep_tree(
+            pkgs, requtils.PipIndex(stats), stats=stats, jobs=jobs
+        )
+    assert {k: set(v) for k, v in actual} == {k: set(v) for k, v in expected}
+    # Lookups in the pool's threads are nested in the phase they were made in
+    assert list(stats.phases) == ["resolve", "resolve/pip show"]
+    # Every package is only looked up once
+    looked_up = [p for c in mock_run.call_args_list[calls:] for p in c.args[0][2:]]
+    assert sorted(looked_up) == sorted(set(looked_up))
+    assert stats.counters["packages_looked_up"] == len(looked_up)
+
+
+class CountingIndex:
+    """Index of a graph given as a dict, counting the lookups of each package"""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.lookups = collections.Counter()
+
+    def show(self, pkgs):
+        self.lookups.update(pkgs)
+        return [requtils.ParsedShowOutput(p, self.graph[p]) for p in pkgs]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_build_dep_tree_visits_each_package_once(jobs):
+    # A cycle, and dependencies shared between rounds
+    index = CountingIndex(
+        {
+            "app": ["web", "urllib3"],
+            "web": ["requests", "app"],
+            "requests": ["urllib3", "certifi"],
+            "urllib3": ["certifi"],
+            "certifi": [],
+        }
+    )
+    stats = requtils.Stats()
+    graph = requtils.build_dep_tree(["app"], index, stats, jobs)
+    assert sorted(graph.nodes()) == sorted(index.graph)
+    assert graph.get_dependencies("web") == {"requests", "app"}
+    assert set(index.lookups.values()) == {1}
+    assert stats.counters["packages_looked_up"] == 5
+
+
+def test_build_dep_tree_normalizes_names():
+    index = CountingIndex({"Foo_Bar": ["foo-bar"], "foo-bar": []})
+    requtils.build_dep_tree(["Foo_Bar", "foo.bar"], index)
+    assert index.lookups == {"Foo_Bar": 1}
+
+
+@pytest.mark.parametrize(
+    "output, expected",
+    [
+        (
+            b"pip 23.0 from /env/lib/python3.11/site-packages/pip (python 3.11)\n",
+            "/env/lib/python3.11/site-packages",
+        ),
+        (b"not pip\n", None),
+    ],
+)
+def test_pip_site_packages(mocker, output, expected):
+    mock_run = mocker.patch("subprocess.run")
+    mock_run.return_value.stdout = output
+    assert requtils.pip_site_packages() == expected
+    mock_run.side_effect = FileNotFoundError
+    assert requtils.pip_site_packages() is None
+
+
+@pytest.mark.parametrize(
+    "pip, expected",
+    [("scripts", "metadata"), ("elsewhere", "pip"), (None, "metadata")],
+)
+def test_default_backend(tmp_path, mocker, pip, expected):
+    (tmp_path / "scripts").mkdir()
+    (tmp_path / "elsewhere").mkdir()
+    mocker.patch("sysconfig.get_path", return_value=str(tmp_path / "scripts"))
+    which = str(tmp_path / pip / "pip") if pip is not None else None
+    mocker.patch("shutil.which", return_value=which)
+    assert requtils.default_backend() == expected
+
+
+class NamedIndex:
+    """Index returning the names of packages as their metadata spells them"""
+
+    def __init__(self, graph):
+        self.graph = {metadata.normalize_name(name): name for name in graph}
+        self.deps = graph
+
+    def show(self, pkgs):
+        names = (self.graph.get(metadata.normalize_name(p)) for p in pkgs)
+        return [requtils.ParsedShowOutput(n, self.deps[n]) for n in names if n]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_build_dep_tree_renames_dependencies(jobs):
+    index = NamedIndex(
+        {"Flask": ["jinja2", "markupsafe"], "Jinja2": ["MarkupSafe"], "MarkupSafe": []}
+    )
+    graph = requtils.build_dep_tree(["flask", "Missing_Pkg"], index, jobs=jobs)
+    assert sorted(graph.nodes()) == ["Flask", "Jinja2", "MarkupSafe"]
+    assert graph.get_dependencies("Flask") == {"Jinja2", "MarkupSafe"}
+    assert graph.get_dependants("MarkupSafe") == {"Flask", "Jinja2"}
+
+
+def test_build_dep_tree_concurrent_does_not_wait_for_rounds():
+    """Dependencies are looked up while the rest of their round is running"""
+    dep_looked_up = threading.Event()
+
+    class Index:
+        def show(self, pkgs):
+            if pkgs == ["slow"]:
+                assert dep_looked_up.wait(timeout=5)
+                return [requtils.ParsedShowOutput("slow", [])]
+            if pkgs == ["fast"]:
+                return [requtils.ParsedShowOutput("fast", ["dep"])]
+            dep_looked_up.set()
+            return [requtils.ParsedShowOutput(p, []) for p in pkgs]
+
+    graph = requtils.build_dep_tree(["slow", "fast"], Index(), jobs=2)
+    assert sorted(graph.nodes()) == ["dep", "fast", "slow"]
+
+
 def test_build_dependency_list(mocker):
     """Dependency Tree build out should identify all the dependencies a module has"""
     # Essentially we want to make sure that the values returned from the system
@@ -134,6 +461,16 @@ def test_get_dependency_versions(mocker):
     }
 
 
+def test_pip_freeze_runs_once(mocker):
+    mock_run = mocker.patch("subprocess.run")
+    mock_run.side_effect = mock_pip_freeze
+
+    index = requtils.PipIndex()
+    requtils.get_dependency_versions(["foo"], index)
+    requtils.get_dependency_versions(["baz"], index)
+    assert mock_run.call_count == 1
+
+
 def test_parse_versions():
     out_ = b"foo==1.0.0\nbaz==0.1.0\ngit-repo @ git+https://github.com/gitrepo@commit"
     assert {
@@ -152,12 +489,18 @@ class CLIMocker:
         self._orig_argv = sys.argv
         patched_argv = unittest.mock.patch.object(sys, "argv", self._cli_args)
         self._patched_argv = patched_argv.start()
-        self._mock_run = unittest.mock.patch("subprocess.run").start()
+        self._run_patcher = unittest.mock.patch("subprocess.run")
+        self._mock_run = self._run_patcher.start()
         self._mock_run.side_effect = mock_subprocess_run
+        return self
+
+    @property
+    def mock_run(self):
+        return self._mock_run
 
     def __exit__(self, exc_type, exc_value, traceback):
         sys.argv = self._orig_argv
-        self._mock_run.stop()
+        self._run_patcher.stop()
 
 
 def run_realreq():
@@ -172,7 +515,8 @@ class ArgvBuilder:
     """Builds out the Command Line Argv"""
 
     def __init__(self):
-        self._argvs = ["cmd"]
+        # The CLI tests mock pip, rather than read the test environment
+        self._argvs = ["cmd", "--backend", "pip"]
 
     def add_flag(self, flag: CLIFlag):
         self._argvs.extend(flag)
@@ -224,6 +568,253 @@ class TestCLI:
         actual = self.execute_with_args(args)
         assert actual == "".join("{0}=={1}\n".format(k, v) for k, v in expected.items())
 
+    def test_metadata_backend(self, source_flag, source_files, site_packages, mocker):
+        mocker.patch("sys.path", [str(site_packages)])
+        args = (
+            ArgvBuilder()
+            .add_flag(source_flag(source_files))
+            .add_flag(("--deep", "--backend", "metadata"))
+            .arguments()
+        )
+        # Like `pip show`, names are matched after normalization
+        graph = graph_data.GraphTestData(
+            GRAPH_PATH, subset=["requests", "foo", "abbreviation", "fake-pkg"]
+        )
+        expected = graph.dep_versions()
+        actual = self.execute_with_args(args)
+        assert actual == "".join("{0}=={1}\n".format(k, v) for k, v in expected.items())
+
+    def test_repeated_deep_run_uses_metadata_cache(
+        self, source_flag, source_files, deep_flag
+    ):
+        args = (
+            ArgvBuilder()
+            .add_flag(source_flag(source_files))
+            .add_flag(deep_flag())
+            .arguments()
+        )
+        first = self.execute_with_args(args)
+        output_buff = io.StringIO()
+        with CLIMocker(args) as cli, contextlib.redirect_stdout(output_buff):
+            run_realreq()
+        assert output_buff.getvalue() == first
+        commands = [
+            c.args[0][1] for c in cli.mock_run.call_args_list if c.args[0][0] == "pip"
+        ]
+        assert commands == ["--version"]
+
+    def test_pip_environment_change_invalidates_cache(
+        self, source_flag, source_files, tmp_path, mocker
+    ):
+        """The cache follows the environment of pip, not the one realreq runs in"""
+        site = tmp_path / "pip-site-packages"
+        site.mkdir()
+        mocker.patch.object(requtils, "pip_site_packages", return_value=str(site))
+        args = ArgvBuilder().add_flag(source_flag(source_files)).arguments()
+        args = args + ["--deep"]
+        first = self.execute_with_args(args)
+        write_dist_info(site, "new-pkg", "1.0.0", [])
+        with CLIMocker(args) as cli, contextlib.redirect_stdout(io.StringIO()):
+            run_realreq()
+        commands = [
+            c.args[0][1] for c in cli.mock_run.call_args_list if c.args[0][0] == "pip"
+        ]
+        assert "show" in commands and "freeze" in commands
+
+    def test_why(self, source_flag, source_files):
+        args = (
+            ArgvBuilder()
+            .add_flag(source_flag(source_files))
+            .add_flag(("--why", "pip", "--why", "notused"))
+            .arguments()
+        )
+        actual = self.execute_with_args(args)
+        assert actual == (
+            "requests -> spam -> egg -> pip\nnotused is not required by your source\n"
+        )
+
+    def test_why_normalizes_names(self, tmp_path, mixed_case_site, mocker):
+        mocker.patch("sys.path", [str(mixed_case_site)])
+        (tmp_path / "app.py").write_text("import flask\n")
+        args = (
+            ArgvBuilder()
+            .add_flag(("-s", str(tmp_path / "app.py"), "--backend", "metadata"))
+            .add_flag(("--why", "Jinja2", "--why", "markupsafe"))
+            .arguments()
+        )
+        actual = self.execute_with_args(args)
+        assert actual == "Flask -> Jinja2\nFlask -> MarkupSafe\n"
+
+    def test_watch(self, source_flag, source_files, mocker):
+        target = source_files if source_files.is_file() else source_files / "main.py"
+
+        def sleep(seconds):
+            # Add an import after the first poll, and stop after the second
+            if mock_sleep.call_count > 1:
+                raise KeyboardInterrupt
+            with target.open("a") as fi:
+                fi.write("\nimport baz\n")
+
+        mock_sleep = mocker.patch("time.sleep", side_effect=sleep)
+        args = (
+            ArgvBuilder()
+            .add_flag(source_flag(source_files))
+            .add_flag(("--watch",))
+            .arguments()
+        )
+        actual = self.execute_with_args(args)
+        assert actual == (
+            "abbreviation==1.2.1\nfoo==1.0.0\nrequests==0.2.0\n"
+            "abbreviation==1.2.1\nbaz==0.1.0\nfoo==1.0.0\nrequests==0.2.0\n"
+        )
+
+    @pytest.mark.parametrize("flags, shown", [((), 1), (("--explain",), 2)])
+    def test_watch_moved_imports(self, source_flag, source_files, mocker, flags, shown):
+        """Moving an import only changes the output when its place is shown"""
+        target = source_files if source_files.is_file() else source_files / "main.py"
+
+        def sleep(seconds):
+            if mock_sleep.call_count > 1:
+                raise KeyboardInterrupt
+            target.write_text("\n" + target.read_text())
+
+        mock_sleep = mocker.patch("time.sleep", side_effect=sleep)
+        args = (
+            ArgvBuilder()
+            .add_flag(source_flag(source_files))
+            .add_flag(("--watch",) + flags)
+            .arguments()
+        )
+        display = mocker.spy(realreq.RealReq, "_display")
+        self.execute_with_args(args)
+        assert display.call_count == shown
+
+    def test_json_format(self, source_flag, source_files, deep_flag):
+        args = (
+            ArgvBuilder()
+            .add_flag(source_flag(source_files))
+            .add_flag(deep_flag())
+            .add_flag(("--format", "json"))
+            .arguments()
+        )
+        records = {
+            r["name"]: r for r in json.loads(self.execute_with_args(args))["packages"]
+        }
+        main = "main.py" if source_files.is_dir() else source_files.name
+        assert records["requests"] == {
+            "name": "requests",
+            "version": "0.2.0",
+            "requirement": "requests==0.2.0",
+            "dependencies": ["baz", "spam"],
+            "dependants": [],
+            "sources": [main],
+            "imports": [{"file": main, "line": 2}],
+        }
+        # Dependencies of imported packages aren't imported by any file
+        assert records["spam"]["sources"] == []
+        assert records["spam"]["dependants"] == ["requests"]
+
+    def test_jsonl_format(self, source_flag, source_files):
+        args = (
+            ArgvBuilder()
+            .add_flag(source_flag(source_files))
+            .add_flag(("--format", "jsonl"))
+            .arguments()
+        )
+        lines = self.execute_with_args(args).splitlines()
+        records = [json.loads(line) for line in lines]
+        # Shallow runs list every import, installed or not
+        assert [r["name"] for r in records] == [
+            "abbreviation",
+            "fake_pkg",
+            "foo",
+            "local_module2",
+            "requests",
+        ]
+        assert records[3]["requirement"] is None
+        # Only the direct dependencies of installed packages are looked up
+        assert records[4]["dependencies"] == ["baz", "spam"]
+        assert records[3]["dependencies"] is None
+        assert {r["dependants"] for r in records} == {None}
+
+    def test_dot_format(self, source_flag, source_files):
+        args = (
+            ArgvBuilder()
+            .add_flag(source_flag(source_files))
+            .add_flag(("--format", "dot"))
+            .arguments()
+        )
+        actual = self.execute_with_args(args)
+        assert actual.startswith("digraph requirements {\n")
+        assert '  "requests" [label="requests==0.2.0"];\n' in actual
+        assert '  "requests" -> "spam";\n' in actual
+        assert actual.endswith("}\n")
+
+    def test_tree_format(self, source_flag, source_files):
+        args = (
+            ArgvBuilder()
+            .add_flag(source_flag(source_files))
+            .add_flag(("--format", "tree"))
+            .arguments()
+        )
+        actual = self.execute_with_args(args)
+        assert actual.startswith("- abbreviation\n- foo\n  |- bar\n")
+
+    def test_explain(self, source_flag, source_files):
+        args = (
+            ArgvBuilder()
+            .add_flag(source_flag(source_files))
+            .add_flag(("--explain", "FOO", "spam"))
+            .arguments()
+        )
+        main = "main.py" if source_files.is_dir() else source_files.name
+        assert self.execute_with_args(args) == (
+            f"foo\n  {main}:3\n  {main}:6\nspam is not imported by your source\n"
+        )
+
+    def test_explain_alias(self, source_flag, source_files):
+        args = (
+            ArgvBuilder()
+            .add_flag(source_flag(source_files))
+            .add_flag(("--explain", "abbrev"))
+            .arguments()
+        )
+        main = "main.py" if source_files.is_dir() else source_files.name
+        # Found under the distribution the import is renamed to by the aliases
+        assert self.execute_with_args(args) == f"abbreviation\n  {main}:7\n"
+
+    def test_stats_file(self, source_flag, source_files, deep_flag, tmp_path):
+        stats_file = tmp_path / "stats.json"
+        args = (
+            ArgvBuilder()
+            .add_flag(source_flag(source_files))
+            .add_flag(deep_flag())
+            .add_flag(("--no-cache", "--stats-file", str(stats_file)))
+            .arguments()
+        )
+        self.execute_with_args(args)
+        stats = json.loads(stats_file.read_text())
+        assert list(stats["phases"]) == [
+            "fingerprint",
+            "scan",
+            "scan/aliases",
+            "scan/walk",
+            "scan/parse",
+            "resolve",
+            "resolve/pip show",
+            "display",
+            "display/pip freeze",
+            "save",
+        ]
+        counters = stats["counters"]
+        assert counters["files_scanned"] == 1
+        assert counters["bfs_rounds"] == counters["pip_show_calls"] == 4
+        assert counters["pip_freeze_calls"] == 1
+        assert (counters["graph_nodes"], counters["graph_edges"]) == (9, 6)
+        # Every package is looked up exactly once, the 9 installed packages, and
+        # the 2 imports that aren't installed
+        assert counters["packages_looked_up"] == 11
+
     def test_cli_aliases(
         self,
         source_flag,
@@ -270,6 +861,146 @@ class TestCLI:
         actual = self.execute_with_args(args)
         assert "fake-pkg==0.0.1" in actual
 
+    def test_auto_aliases(self, source_flag, source_files, tmp_path, mocker):
+        """Import names are resolved to the distribution that provides them"""
+        site = tmp_path / "site-packages"
+        site.mkdir()
+        dist_info = write_dist_info(site, "baz", "0.0.1", [])
+        (dist_info / "top_level.txt").write_text("fake_pkg\n")
+        # The environment pip manages, which needn't be realreq's own
+        mocker.patch.object(requtils, "pip_site_packages", return_value=str(site))
+
+        args = ArgvBuilder().add_flag(source_flag(source_files)).arguments()
+        actual = self.execute_with_args(args)
+        assert "baz==" in actual and "fake-pkg" not in actual
+        # Given aliases override the ones found in the environment
+        args = (
+            ArgvBuilder()
+            .add_flag(source_flag(source_files))
+            .add_flag(("-a", "fake_pkg=fake-pkg"))
+            .arguments()
+        )
+        assert "fake-pkg==0.0.1" in self.execute_with_args(args)
+        args = (
+            ArgvBuilder()
+            .add_flag(source_flag(source_files))
+            .add_flag(("--no-auto-aliases",))
+            .arguments()
+        )
+        assert "baz==" not in self.execute_with_args(args)
+
+    @staticmethod
+    def make_monorepo(root: pathlib.Path) -> pathlib.Path:
+        for project, marker, source in [
+            ("svc_a", "setup.py", "import requests\nimport svc_a.api\n"),
+            ("svc_b", "pyproject.toml", "import foo\nimport requests\n"),
+        ]:
+            (root / project).mkdir(parents=True)
+            (root / project / marker).write_text("")
+            (root / project / "main.py").write_text(source)
+        # Outside of every project
+        (root / "tool.py").write_text("import fake_pkg\n")
+        return root
+
+    @pytest.mark.parametrize("discover", [True, False])
+    def test_projects(self, tmp_path, discover):
+        root = self.make_monorepo(tmp_path / "repo")
+        args = ArgvBuilder().add_flag(("-s", str(root), "-d", "--no-cache"))
+        if discover:
+            args.add_flag(("--discover-projects",))
+        else:
+            args.add_flag(("-p", str(root / "svc_a"), "--project", str(root / "svc_b")))
+
+        output_buff = io.StringIO()
+        with CLIMocker(args.arguments()) as mocker, contextlib.redirect_stdout(
+            output_buff
+        ):
+            run_realreq()
+        assert output_buff.getvalue() == ""
+        svc_a = (root / "svc_a" / "requirements.txt").read_text()
+        svc_b = (root / "svc_b" / "requirements.txt").read_text()
+        assert svc_a == "".join(
+            f"{k}=={v}\n"
+            for k, v in GRAPH.dep_versions().items()
+            if k in ("requests", "baz", "spam", "egg", "wheel", "pip")
+        )
+        assert svc_b == "".join(
+            f"{k}=={v}\n"
+            for k, v in GRAPH.dep_versions().items()
+            if k in ("foo", "bar", "requests", "baz", "spam", "egg", "wheel", "pip")
+        )
+        # The projects are resolved together, so each package is shown once
+        shows = [c for c in mocker.mock_run.call_args_list if c.args[0][1] == "show"]
+        assert len(shows) == 4
+        assert not (root / "requirements.txt").exists()
+
+    def test_projects_normalize_names(self, tmp_path, mixed_case_site, mocker):
+        mocker.patch("sys.path", [str(mixed_case_site)])
+        root = tmp_path / "repo"
+        for project, source in [("web", "import flask\n"), ("tpl", "import jinja2\n")]:
+            (root / project).mkdir(parents=True)
+            (root / project / "pyproject.toml").write_text("")
+            (root / project / "main.py").write_text(source)
+        args = ArgvBuilder().add_flag(("-s", str(root), "-d", "--no-cache"))
+        args.add_flag(("--backend", "metadata", "--discover-projects"))
+        assert self.execute_with_args(args.arguments()) == ""
+        assert (root / "web" / "requirements.txt").read_text() == (
+            "Flask==2.0.0\nJinja2==3.0.0\nMarkupSafe==2.1.0\n"
+        )
+        assert (root / "tpl" / "requirements.txt").read_text() == (
+            "Jinja2==3.0.0\nMarkupSafe==2.1.0\n"
+        )
+
+    def test_exclude(self, tmp_path):
+        for path, content in {
+            "main.py": "import requests\n",
+            ".venv/lib/site.py": "import foo\n",
+            "vendor/lib.py": "import abbrev\n",
+        }.items():
+            (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / path).write_text(content)
+
+        args = ArgvBuilder().add_flag(("-s", str(tmp_path), "--no-cache"))
+        args.add_flag(("--exclude", "vendor/"))
+        versions = GRAPH.dep_versions()
+        assert self.execute_with_args(args.arguments()) == (
+            f"requests=={versions['requests']}\n"
+        )
+        args.add_flag(("--no-ignore",))
+        assert self.execute_with_args(args.arguments()) == (
+            f"foo=={versions['foo']}\nrequests=={versions['requests']}\n"
+        )
+
+    def test_project_outside_source(self, tmp_path, source_files, capsys):
+        args = ["cmd", "-s", str(tmp_path / "repo"), "-p", str(tmp_path)]
+        (tmp_path / "repo").mkdir()
+        with pytest.raises(SystemExit):
+            with CLIMocker(args):
+                run_realreq()
+        assert "is not a directory in" in capsys.readouterr().err
+
+    @pytest.mark.parametrize(
+        "flags", [("--why", "pip"), ("--cycles",), ("--explain",), ("--explain", "foo")]
+    )
+    @pytest.mark.parametrize("discover", [True, False])
+    def test_projects_reject_diagnostics(self, tmp_path, capsys, flags, discover):
+        root = self.make_monorepo(tmp_path / "repo")
+        args = ["cmd", "-s", str(root)] + list(flags)
+        args += ["--discover-projects"] if discover else ["-p", str(root / "svc_a")]
+        with pytest.raises(SystemExit):
+            with CLIMocker(args):
+                run_realreq()
+        assert f"--project can't be used with {flags[0]}" in capsys.readouterr().err
+        assert not (root / "svc_a" / "requirements.txt").exists()
+
+    @pytest.mark.parametrize("jobs", ["-1", "many"])
+    def test_invalid_jobs(self, source_files, capsys, jobs):
+        args = ["cmd", "-s", str(source_files), "-j", jobs]
+        with pytest.raises(SystemExit):
+            with CLIMocker(args):
+                run_realreq()
+        assert f"invalid job count: '{jobs}'" in capsys.readouterr().err
+
     def test_cli_invert_tree(self, source_flag, source_files, invert_flag, alias_flag):
         args = (
             ArgvBuilder()
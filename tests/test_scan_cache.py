@@ -0,0 +1,159 @@
+"""Tests for the persistent scan cache"""
+import os
+import subprocess
+
+import pytest
+
+import _realreq.realreq as realreq
+import _realreq.requtils as requtils
+from _realreq.requtils.scan_cache import ScanCache
+
+
+@pytest.fixture
+def source(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "main.py").write_text("import requests\nfrom foo import bar\n")
+    (src / "other.py").write_text("import spam\n")
+    return src
+
+
+def test_cache_round_trip(tmp_path, source):
+    path = str(source / "main.py")
+    stat = os.stat(path)
+    with ScanCache(tmp_path / "cache") as cache:
+        assert cache.get(path, stat) is None
+        cache.put(path, stat, [("requests", 1), ("foo", 2), ("requests", 7)])
+    with ScanCache(tmp_path / "cache") as cache:
+        assert cache.get(path, stat) == [("requests", 1), ("foo", 2), ("requests", 7)]
+
+
+def test_cached_scan_keeps_line_numbers(tmp_path, source):
+    with ScanCache(tmp_path / "cache") as cache:
+        first = realreq.find_imports(source, cache=cache)
+    with ScanCache(tmp_path / "cache") as cache:
+        second = realreq.find_imports(source, cache=cache)
+    assert second["foo"] == first["foo"] == [(str(source.resolve() / "main.py"), 2)]
+
+
+def test_unchanged_files_are_not_rescanned(tmp_path, source, mocker):
+    with ScanCache(tmp_path / "cache") as cache:
+        first = realreq.search_source(source, cache=cache)
+    scan = mocker.spy(requtils, "scan_file")
+    with ScanCache(tmp_path / "cache") as cache:
+        second = realreq.search_source(source, cache=cache)
+    assert first == second == {"requests", "foo", "spam"}
+    assert scan.call_count == 0
+
+
+def test_changed_files_are_rescanned(tmp_path, source):
+    with ScanCache(tmp_path / "cache") as cache:
+        realreq.search_source(source, cache=cache)
+    (source / "other.py").write_text("import egg  # now a different size\n")
+    with ScanCache(tmp_path / "cache") as cache:
+        assert realreq.search_source(source, cache=cache) == {"requests", "foo", "egg"}
+
+
+def test_hash_reuses_entries_with_new_timestamps(tmp_path, source, mocker):
+    with ScanCache(tmp_path / "cache", hash_contents=True) as cache:
+        realreq.search_source(source, cache=cache)
+    os.utime(source / "main.py", ns=(0, 0))
+    scan = mocker.spy(requtils, "scan_file")
+    with ScanCache(tmp_path / "cache", hash_contents=True) as cache:
+        assert realreq.search_source(source, cache=cache) == {"requests", "foo", "spam"}
+    assert scan.call_count == 0
+
+
+def test_prune_removes_deleted_files(tmp_path, source):
+    with ScanCache(tmp_path / "cache") as cache:
+        realreq.search_source(source, cache=cache)
+    (source / "other.py").unlink()
+    with ScanCache(tmp_path / "cache") as cache:
+        realreq.search_source(source, cache=cache)
+    with ScanCache(tmp_path / "cache") as cache:
+        assert str((source / "other.py").resolve()) not in cache._get_entries()
+
+
+def _git(cwd, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        + list(args),
+        cwd=str(cwd),
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def test_since_only_scans_changed_files(tmp_path, source, mocker):
+    _git(source, "init", "-q")
+    _git(source, "add", ".")
+    _git(source, "commit", "-q", "-m", "base")
+    with ScanCache(tmp_path / "cache") as cache:
+        realreq.search_source(source, cache=cache)
+
+    (source / "other.py").unlink()
+    (source / "new.py").write_text("import egg\n")
+    (source / "sub").mkdir()
+    (source / "sub" / "added.py").write_text("import wheel\n")
+    _git(source, "add", "sub")
+    scan = mocker.spy(requtils, "scan_file")
+    walk = mocker.spy(requtils, "iter_source_files")
+    with ScanCache(tmp_path / "cache") as cache:
+        found = realreq.search_source(source, cache=cache, since="HEAD")
+    assert found == {"requests", "foo", "egg", "wheel"}
+    assert {c.args[0] for c in scan.call_args_list} == {
+        str((source / "new.py").resolve()),
+        str((source / "sub" / "added.py").resolve()),
+    }
+    assert walk.call_count == 0
+
+
+def test_since_without_cached_scan_scans_everything(tmp_path, source):
+    _git(source, "init", "-q")
+    with ScanCache(tmp_path / "cache") as cache:
+        found = realreq.search_source(source, cache=cache, since="HEAD")
+    assert found == {"requests", "foo", "spam"}
+
+
+@pytest.mark.parametrize(
+    "repository, warning",
+    [
+        (True, "Unable to find the files changed since no-such-ref"),
+        (False, "doesn't record the commit it was made at"),
+    ],
+)
+def test_since_git_errors_scan_everything(
+    tmp_path, source, capsys, repository, warning
+):
+    if repository:
+        _git(source, "init", "-q")
+        _git(source, "add", ".")
+        _git(source, "commit", "-q", "-m", "base")
+    with ScanCache(tmp_path / "cache") as cache:
+        realreq.search_source(source, cache=cache)
+    (source / "new.py").write_text("import egg\n")
+    with ScanCache(tmp_path / "cache") as cache:
+        found = realreq.search_source(source, cache=cache, since="no-such-ref")
+    assert found == {"requests", "foo", "spam", "egg"}
+    err = capsys.readouterr().err
+    assert warning in err and "scanning every file" in err
+
+
+def test_since_compares_against_the_commit_of_the_cached_scan(tmp_path, source, capsys):
+    _git(source, "init", "-q")
+    _git(source, "add", ".")
+    _git(source, "commit", "-q", "-m", "base")
+    # Uncommitted when cached, and reverted before the next scan
+    (source / "other.py").write_text("import egg\n")
+    with ScanCache(tmp_path / "cache") as cache:
+        realreq.search_source(source, cache=cache)
+    _git(source, "checkout", "-q", "--", "other.py")
+    # Committed after the cached scan
+    (source / "main.py").write_text("import wheel\n")
+    _git(source, "commit", "-q", "-am", "change")
+    with ScanCache(tmp_path / "cache") as cache:
+        found = realreq.search_source(source, cache=cache, since="HEAD")
+    assert found == {"wheel", "spam"}
+    assert "comparing against it instead" in capsys.readouterr().err
+    with ScanCache(tmp_path / "cache") as cache:
+        assert realreq.search_source(source, cache=cache, since="HEAD") == found
@@ -0,0 +1,82 @@
+"""Tests for the run statistics"""
+import concurrent.futures
+import json
+import time
+
+from _realreq.requtils.stats import Stats, phase, timed
+
+
+def test_nested_phases_are_named_after_their_parents():
+    stats = Stats()
+    with stats.phase("resolve"):
+        with stats.phase("pip show"):
+            pass
+        with phase(stats, "pip show"):
+            pass
+    with phase(None, "ignored"):
+        pass
+    assert list(stats.phases) == ["resolve", "resolve/pip show"]
+    assert stats.phases["resolve"] >= stats.phases["resolve/pip show"] > 0
+
+
+def test_counters_and_reports():
+    stats = Stats()
+    stats.count("files_scanned")
+    stats.update({"files_scanned": 2, "bytes_read": 10})
+    with stats.phase("scan"):
+        pass
+    assert stats.counters == {"files_scanned": 3, "bytes_read": 10}
+    assert json.loads(stats.to_json())["counters"] == stats.counters
+    report = stats.report().splitlines()
+    assert report[1].startswith("scan ")
+    assert report[-2].split() == ["files_scanned", "3"]
+
+
+def test_threads_nest_their_own_phases():
+    stats = Stats()
+
+    def work():
+        with stats.phase("pip show"):
+            stats.count("pip_show_calls")
+
+    with stats.phase("resolve"):
+        with concurrent.futures.ThreadPoolExecutor(4) as pool:
+            for future in [pool.submit(work) for _ in range(20)]:
+                future.result()
+    assert list(stats.phases) == ["resolve", "pip show"]
+    assert stats.counters == {"pip_show_calls": 20}
+
+
+def test_bound_work_is_nested_in_the_submitting_phase():
+    stats = Stats()
+
+    def work():
+        with stats.phase("pip show"):
+            pass
+
+    with stats.phase("resolve"):
+        bound = stats.bind(work)
+        with concurrent.futures.ThreadPoolExecutor(2) as pool:
+            for future in [pool.submit(bound) for _ in range(4)]:
+                future.result()
+            # The pool's threads are left in their own phases afterwards
+            pool.submit(work).result()
+    assert list(stats.phases) == ["resolve", "resolve/pip show", "pip show"]
+
+
+def test_timed_iterations_are_nested_in_the_current_phase():
+    stats = Stats()
+
+    def walk():
+        time.sleep(0.01)
+        yield "a"
+        yield "b"
+
+    with stats.phase("scan"):
+        for _ in timed(walk(), stats, "walk"):
+            time.sleep(0.02)
+        stats.add_time("parse", 1.5)
+    assert list(timed(["a"], None, "ignored")) == ["a"]
+    assert list(stats.phases) == ["scan", "scan/walk", "scan/parse"]
+    assert 0.01 <= stats.phases["scan/walk"] < 0.03
+    assert stats.phases["scan/parse"] == 1.5